@@ -1,17 +1,57 @@
-from fastapi import APIRouter
+import asyncio
+from typing import AsyncGenerator, Optional
+from contextlib import aclosing, suppress
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from schemas.chat import ChatRequest, ChatResponse, ModelSelectionRequest, ModelSelectionResponse
 from services.chat_service import generate_ai_response, generate_ai_response_stream
-from services.rag_service import document_store
+from api.deps import check_session_id, lease_session_store
 from services.model_manager import model_manager
+from services.sse import STREAM_FORMATS
 
 # 1. Create a new router
 router = APIRouter(tags=["Chat"])
 
 
+async def _wait_for_disconnect(http_request: Request):
+    """Return once the client has disconnected (the request body was already read)."""
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _stream_until_disconnect(http_request: Request, frames: AsyncGenerator[str, None]):
+    """
+    Relay SSE frames while the client is connected. Each next frame is raced against a
+    disconnect watcher (as Starlette does), so a client that leaves while the model is still
+    thinking cancels the frame generator at once, which cancels the upstream Gemini stream
+    instead of letting it run to completion for nobody.
+    """
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    try:
+        async with aclosing(frames):
+            while True:
+                next_frame = asyncio.ensure_future(frames.__anext__())
+                await asyncio.wait({next_frame, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_frame.done():
+                    print("Client disconnected; cancelling the response stream")
+                    next_frame.cancel()
+                    with suppress(asyncio.CancelledError, StopAsyncIteration):
+                        await next_frame
+                    break
+                try:
+                    frame = next_frame.result()
+                except StopAsyncIteration:
+                    break
+                yield frame
+    finally:
+        disconnected.cancel()
+
+
 # 2. Define the streaming chat endpoint
 @router.post("/chat/stream")
-async def handle_chat_stream_request(request: ChatRequest):
+async def handle_chat_stream_request(request: ChatRequest, http_request: Request):
     """
     This endpoint receives a user's message and returns the AI's response as a stream.
     It now supports document processing via base64 content and optional model selection per request.
@@ -20,19 +60,23 @@ async def handle_chat_stream_request(request: ChatRequest):
     if request.document:
         print(f"Document info: fileName={request.document.fileName}, fileSize={request.document.fileSize}")
     
-    # Set model if specified in request
-    if request.model:
-        model_manager.set_model(request.model)
-    
+    check_session_id(request.sessionId)
+    if request.streamFormat and request.streamFormat not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid stream format: {request.streamFormat}")
+
     # Return streaming response
+    frames = generate_ai_response_stream(
+        message=request.message,
+        document_base64=request.documentBase64,
+        document_filename=request.document.fileName if request.document else None,
+        image_base64=request.imageBase64,
+        image_filename=request.imageName,
+        session_id=request.sessionId,
+        model_id=request.model,
+        stream_format=request.streamFormat,
+    )
     return StreamingResponse(
-        generate_ai_response_stream(
-            message=request.message,
-            document_base64=request.documentBase64,
-            document_filename=request.document.fileName if request.document else None,
-            image_base64=request.imageBase64,
-            image_filename=request.imageName,
-        ),
+        _stream_until_disconnect(http_request, frames),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -52,18 +96,18 @@ async def handle_chat_request(request: ChatRequest):
     if request.document:
         print(f"Document info: fileName={request.document.fileName}, fileSize={request.document.fileSize}")
     
-    # Set model if specified in request
-    if request.model:
-        model_manager.set_model(request.model)
-    
+    check_session_id(request.sessionId)
+
     # 3. Call the AI service to get a reply, passing document data if available
-    ai_reply = generate_ai_response(
+    ai_reply = await generate_ai_response(
         message=request.message,
         document_base64=request.documentBase64,
         document_filename=request.document.fileName if request.document else None
         ,
         image_base64=request.imageBase64,
         image_filename=request.imageName,
+        session_id=request.sessionId,
+        model_id=request.model,
     )
 
     # 4. Return the reply in the defined response shape
@@ -71,30 +115,34 @@ async def handle_chat_request(request: ChatRequest):
 
 
 @router.get("/documents/status")
-async def get_documents_status():
+async def get_documents_status(session_id: Optional[str] = Query(None, alias="sessionId")):
     """
-    Get information about currently loaded documents and images.
+    Get information about the documents and images loaded in a session (default namespace if omitted).
     """
-    file_list = document_store.get_file_list()
-    has_content = document_store.has_retriever()
-    return {
-        "has_content": has_content,
-        "file_count": len(file_list),
-        "files": file_list
-    }
+    async with lease_session_store(session_id) as document_store:
+        file_list = document_store.get_file_list()
+        has_content = document_store.has_retriever()
+        return {
+            "session_id": document_store.namespace,
+            "has_content": has_content,
+            "file_count": len(file_list),
+            "files": file_list
+        }
 
 @router.delete("/documents")
-async def clear_documents():
+async def clear_documents(session_id: Optional[str] = Query(None, alias="sessionId")):
     """
-    Clear all processed documents from memory to allow general chat mode.
+    Clear a session's processed documents (default namespace if omitted) to allow general chat mode.
+    Other sessions are not affected.
     """
-    document_store.clear()
+    async with lease_session_store(session_id) as document_store:
+        document_store.clear()
     return {"message": "All documents cleared successfully"}
 
 @router.post("/model/select", response_model=ModelSelectionResponse)
 async def select_model(request: ModelSelectionRequest):
     """
-    Set the AI model to use for chat responses.
+    Set the default AI model for chat requests that do not name one.
     """
     try:
         success = model_manager.set_model(request.model_id)
@@ -0,0 +1,24 @@
+"""
+Request helpers shared by the API routers
+"""
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException
+from services.store_registry import store_registry, is_valid_namespace
+
+
+def check_session_id(session_id: Optional[str]):
+    """Reject session ids that cannot name a document namespace (400)."""
+    if not is_valid_namespace(session_id):
+        raise HTTPException(status_code=400, detail=f"Invalid session id: {session_id}")
+
+
+@asynccontextmanager
+async def lease_session_store(session_id: Optional[str]):
+    """
+    Lease the document namespace of a session for the duration of the block (loading it
+    from disk if it was evicted); it cannot be evicted while the request is using it.
+    """
+    check_session_id(session_id)
+    async with store_registry.lease(session_id) as store:
+        yield store
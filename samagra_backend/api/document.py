@@ -1,14 +1,22 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, status
 from schemas.document import DocumentUploadResponse
-from services.rag_service import process_uploaded_document
+from services.rag_service import StoreCapacityError, aprocess_uploaded_document, content_hash, run_in_ingest_executor
+from api.deps import lease_session_store
+from services.ingest_jobs import ingest_jobs
 
 # Create a new router for document-related endpoints
 router = APIRouter(tags=["Document"])
 
+
 @router.post("/upload-document", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None, alias="sessionId"),
+):
     """
-    Accepts a PDF file upload and processes it to create a vector store.
+    Accepts a PDF file upload and processes it into the session's vector store
+    (the default namespace if no sessionId is sent).
     """
     # Optional: Check if the uploaded file is a PDF
     if file.content_type != "application/pdf":
@@ -16,51 +24,96 @@ async def upload_document(file: UploadFile = File(...)):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid file type. Please upload a PDF."
         )
+    async with lease_session_store(session_id) as document_store:
+        try:
+            # Read the content of the uploaded file as bytes
+            file_content = await file.read()
 
-    try:
-        # Read the content of the uploaded file as bytes
-        file_content = await file.read()
+            # Skip ingestion entirely if these exact bytes are already indexed
+            file_hash = await run_in_ingest_executor(content_hash, file_content)
+            if document_store.find_file_by_hash(file_hash):
+                return DocumentUploadResponse(
+                    success=True,
+                    message=f"Document '{file.filename}' is already indexed and ready for Q&A."
+                )
 
-        # Call the service function from the previous step to process the document
-        success = process_uploaded_document(file_content)
+            # Parse, split and embed on the ingestion thread pool so other requests keep streaming
+            success = await aprocess_uploaded_document(document_store, file_content, file.filename, file_hash)
 
-        if success:
-            return DocumentUploadResponse(
-                success=True,
-                message=f"Document '{file.filename}' processed and ready for Q&A."
-            )
-        else:
+            if success:
+                return DocumentUploadResponse(
+                    success=True,
+                    message=f"Document '{file.filename}' processed and ready for Q&A."
+                )
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to process the document in the RAG service."
+                )
+
+        except StoreCapacityError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to process the document in the RAG service."
+                detail=f"An unexpected error occurred: {str(e)}"
             )
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An unexpected error occurred: {str(e)}"
-        )
-
 @router.post("/upload")
-async def upload_document_v2(file: UploadFile = File(...)):
+async def upload_document_v2(
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None, alias="sessionId"),
+):
     """
-    Upload and process a document file (alternative endpoint for frontend compatibility).
+    Upload a document for background processing (alternative endpoint for frontend compatibility).
+    Returns a job id immediately; poll /documents/jobs/{job_id} for progress.
     """
-    try:
-        # Read the file content
-        file_content = await file.read()
+    async with lease_session_store(session_id) as document_store:
+        try:
+            # Read the file content
+            file_content = await file.read()
         
-        # Process the document
-        success = process_uploaded_document(file_content)
+            # Skip ingestion entirely if these exact bytes are already indexed
+            file_hash = await run_in_ingest_executor(content_hash, file_content)
+            if document_store.find_file_by_hash(file_hash):
+                return {
+                    "message": f"Document '{file.filename}' already indexed",
+                    "filename": file.filename,
+                    "size": len(file_content),
+                    "already_indexed": True,
+                    "job_id": None,
+                    "status": "completed"
+                }
         
-        if success:
+            # Queue the document; chunks become searchable as each batch is indexed
+            job = ingest_jobs.submit(file_content, file.filename, file_hash, document_store.namespace)
             return {
-                "message": f"Document '{file.filename}' uploaded and processed successfully",
+                "message": f"Document '{file.filename}' accepted for processing",
                 "filename": file.filename,
-                "size": len(file_content)
+                "size": len(file_content),
+                "already_indexed": False,
+                "job_id": job.id,
+                "status": job.status
             }
-        else:
-            raise HTTPException(status_code=400, detail="Failed to process document")
             
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
\ No newline at end of file
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """
+    Report the progress of a background ingestion job per stage.
+    """
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id: {job_id}")
+    return job.to_dict()
+
+@router.get("/memory")
+async def get_memory_report(session_id: Optional[str] = Query(None, alias="sessionId")):
+    """
+    Report the session's index memory against full-dimension float32 storage and the
+    estimated recall cost of its quantization.
+    """
+    async with lease_session_store(session_id) as document_store:
+        return await run_in_ingest_executor(document_store.memory_report)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from services.metrics import metrics
+from services.rag_service import (
+    embedding_cache,
+    embedding_batcher,
+    ocr_cache,
+    ocr_flight,
+    query_embedding_cache,
+    query_embedding_flight,
+    search_cache,
+    search_flight,
+)
+from services.store_registry import store_registry
+from services.chat_service import answer_cache
+
+# Router for operational metrics
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Report in-process counters, latency summaries and cache statistics.
+    """
+    return {
+        **metrics.snapshot(),
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "ocr_cache": {**ocr_cache.stats(), **ocr_flight.stats()},
+        "query_embedding_cache": {**query_embedding_cache.stats(), **query_embedding_flight.stats()},
+        "search_cache": {**search_cache.stats(), **search_flight.stats()},
+        "embedding_batcher": embedding_batcher.stats(),
+        "document_stores": store_registry.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -6,6 +7,103 @@ class Settings(BaseSettings):
     """
     GOOGLE_API_KEY: str
 
+    # Directory holding on-disk state (vector store snapshots, caches)
+    DATA_DIR: str = "data"
+    # Snapshot the vector store to DATA_DIR after each change and restore it at startup
+    VECTOR_STORE_PERSIST: bool = True
+    # Persistent chunk-embedding cache (SQLite in DATA_DIR), bounded by entry count with LRU eviction
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200_000
+    # Retrieved chunks whose word-shingle Jaccard similarity reaches this are collapsed into one
+    NEAR_DUPLICATE_THRESHOLD: float = 0.85
+    # Minimum cosine similarity of the best retrieved chunk for a question to be answered from documents
+    RAG_RELEVANCE_THRESHOLD: float = 0.55
+    # EasyOCR fallback: number of worker processes (one warm reader each), optionally started at boot
+    OCR_POOL_SIZE: int = 1
+    OCR_WARMUP: bool = False
+    # Threads used for blocking ingestion work (PDF parsing, OCR calls, embedding) off the event loop
+    INGEST_WORKERS: int = 2
+    # Threads that run searches (BM25 scoring and FAISS lookups) off the event loop
+    SEARCH_WORKERS: int = 4
+    # PDF parsing: documents with at least PDF_PARALLEL_MIN_PAGES pages are parsed in
+    # PDF_PAGES_PER_TASK page ranges across PDF_PARSE_WORKERS processes
+    PDF_PARSE_WORKERS: int = 2
+    PDF_PAGES_PER_TASK: int = 16
+    PDF_PARALLEL_MIN_PAGES: int = 32
+    # Background upload jobs: how many ingest at once, and chunks indexed per batch (searchable as each lands)
+    INGEST_MAX_CONCURRENT_JOBS: int = 2
+    INGEST_INDEX_BATCH_SIZE: int = 400
+    # Chunk embedding: texts per request (Gemini allows up to 100), concurrent requests, and
+    # retry/backoff when throttled (concurrency is halved on throttling and recovers gradually)
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_BACKOFF_SECONDS: float = 1.0
+    # Per-session document namespaces: each gets its own vector and memory budget, namespaces idle
+    # for NAMESPACE_IDLE_SECONDS are evicted to disk, and least recently used ones are evicted
+    # whenever all loaded namespaces together exceed STORE_MAX_MEMORY_MB
+    NAMESPACE_MAX_VECTORS: int = 100_000
+    NAMESPACE_MAX_MEMORY_MB: int = 512
+    NAMESPACE_IDLE_SECONDS: int = 30 * 60
+    STORE_MAX_MEMORY_MB: int = 1024
+    # Vector index backend per store: flat (exact), hnsw, ivfpq (lossy, opt-in only), or auto (flat,
+    # then HNSW once a store reaches the threshold below; stores are rebuilt in the background)
+    VECTOR_INDEX_TYPE: str = "auto"
+    VECTOR_INDEX_AUTO_HNSW_MIN_VECTORS: int = 20_000
+    # HNSW graph degree and build/search candidate list sizes (higher efSearch: better recall, slower search)
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 80
+    HNSW_EF_SEARCH: int = 64
+    # IVF-PQ: maximum coarse lists, lists probed per search, and PQ sub-quantizers (bytes per vector)
+    IVF_NLIST: int = 4096
+    IVF_NPROBE: int = 16
+    IVFPQ_M: int = 64
+    # Embedding size requested from the model (768, 1536 or 3072 for gemini-embedding-001;
+    # None keeps the native 3072). Changing it invalidates existing snapshots.
+    EMBEDDING_DIMENSIONS: Optional[int] = None
+    # Stored vector precision for flat/HNSW indexes: none (float32, default), or opt-in fp16 / int8
+    # (int8 is trained once a store has 1,000 vectors); IVF-PQ is always compressed
+    VECTOR_QUANTIZATION: str = "none"
+    # Original vectors kept per store to estimate the recall cost of quantization
+    VECTOR_RECALL_SAMPLE_SIZE: int = 500
+    # Hybrid retrieval: BM25 results are fused with vector results by reciprocal rank (RRF_K damps
+    # low ranks); a lexical hit on the query's identifiers that outscores the runner-up by
+    # LEXICAL_DECISIVE_RATIO is answered without embedding the query, provided every identifier
+    # is rare in the store (IDF of at least LEXICAL_DECISIVE_MIN_IDF)
+    HYBRID_SEARCH_ENABLED: bool = True
+    LEXICAL_DECISIVE_RATIO: float = 2.0
+    LEXICAL_DECISIVE_MIN_IDF: float = 1.0
+    RRF_K: int = 60
+    # LRU caches of query embeddings and of search results (results are dropped when the store changes)
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES: int = 2048
+    SEARCH_CACHE_MAX_ENTRIES: int = 1024
+    # RAG context packing: token budget for models without their own context_token_budget, chunks
+    # scoring below this fraction of the best one are dropped, and chunks whose word shingles are
+    # this much contained in an already packed chunk are skipped
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_MIN_RELATIVE_SCORE: float = 0.75
+    CONTEXT_DUPLICATE_CONTAINMENT: float = 0.8
+    # Optional extractive compression before packing: each chunk is cut down to its sentences
+    # sharing the most terms with the question (local and CPU-only, no extra LLM call)
+    CONTEXT_COMPRESSION_ENABLED: bool = False
+    CONTEXT_COMPRESSION_MAX_SENTENCES: int = 3
+    # Semantic cache of RAG answers: a question whose embedding is at least this cosine-similar
+    # to one already answered by the same model over the same documents reuses its answer
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 60 * 60
+    ANSWER_CACHE_MAX_ENTRIES: int = 512
+    # Answer length (tokens) assumed for a stream cancelled before any stream has completed,
+    # when estimating the generation saved by cancelling it
+    STREAM_EXPECTED_ANSWER_TOKENS: int = 300
+    # Streamed text chunks are merged into one SSE frame until this much time has passed since
+    # the last frame or this many characters are waiting (the first chunk is always sent at once)
+    SSE_FLUSH_MS: int = 30
+    SSE_FLUSH_BYTES: int = 512
+    # Cache of OCR results keyed by image content hash
+    OCR_CACHE_MAX_ENTRIES: int = 256
+    OCR_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+
     # This tells Pydantic to load the variables from a .env file
     model_config = SettingsConfigDict(env_file=".env")
 
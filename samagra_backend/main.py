@@ -1,7 +1,14 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.chat import router as chat_router
 from api.document import router as document_router
+from api.metrics import router as metrics_router
+from core.config import settings
+from services.store_registry import store_registry
+from services.rag_service import snapshot_executor
+from services.ocr_service import ocr_pool
+from services.pdf_parser import pdf_parser
 
 # Create the main FastAPI application instance
 app = FastAPI(
@@ -22,6 +29,37 @@ app.add_middleware(
 # Include the router from the api
 app.include_router(chat_router)
 app.include_router(document_router, prefix="/documents")
+app.include_router(metrics_router)
+
+@app.on_event("startup")
+async def restore_document_store():
+    """
+    Restore the default namespace's snapshot so a restart does not require re-uploading documents.
+    Other sessions are restored from disk on their first request.
+    """
+    async with store_registry.lease():
+        pass
+
+@app.on_event("startup")
+async def warm_up_ocr():
+    """
+    Optionally start the EasyOCR workers at boot so the first image does not wait for model loading.
+    """
+    if settings.OCR_WARMUP:
+        await asyncio.get_running_loop().run_in_executor(None, ocr_pool.warm_up)
+
+@app.on_event("shutdown")
+async def save_document_stores():
+    """
+    Write the snapshots of all loaded namespaces, since uploads are saved in the background.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, store_registry.save_all)
+    snapshot_executor.shutdown(wait=True)
+
+@app.on_event("shutdown")
+async def stop_worker_pools():
+    ocr_pool.shutdown()
+    pdf_parser.shutdown()
 
 @app.get("/", tags=["Health Check"])
 async def root():
@@ -13,6 +13,7 @@ class ChatRequest(BaseModel):
     Defines the shape of a request to the /chat endpoint.
     """
     message: str
+    # Model for this request only; the default set via /model/select when omitted
     model: Optional[str] = None
     document: Optional[DocumentInfo] = None
     documentBase64: Optional[str] = None
@@ -21,6 +22,10 @@ class ChatRequest(BaseModel):
     # Inline image support (base64) - used by web frontend when sending images
     imageBase64: Optional[str] = None
     imageName: Optional[str] = None
+    # Session/tenant whose documents are searched and extended (None uses the shared default namespace)
+    sessionId: Optional[str] = None
+    # SSE frame encoding of /chat/stream: "json" (default) or "compact" (raw text data lines)
+    streamFormat: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
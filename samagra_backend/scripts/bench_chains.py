@@ -0,0 +1,59 @@
+"""
+Micro-benchmark of per-request chain setup: building the RAG prompt and LCEL chain on every
+message (as chat_service used to) versus reusing the compiled chain from get_chain.
+
+Runs offline against a fake chat model, so only the LangChain overhead is measured:
+
+    python scripts/bench_chains.py [iterations]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench_chains_"))
+os.environ.setdefault("VECTOR_STORE_PERSIST", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+
+from langchain_core.language_models import FakeListChatModel  # noqa: E402
+from langchain_core.output_parsers import StrOutputParser  # noqa: E402
+from langchain_core.prompts import PromptTemplate  # noqa: E402
+
+from services import chat_service  # noqa: E402
+from services.model_manager import model_manager  # noqa: E402
+
+MODEL_ID = model_manager.get_current_model_id()
+INPUTS = {"context": "The warranty lasts two years. " * 50, "question": "How long is the warranty?"}
+
+
+def build_per_request():
+    """What every RAG turn paid before: template parsing plus chain composition."""
+    prompt = PromptTemplate.from_template(chat_service.RAG_PROMPT.template)
+    return prompt | model_manager.get_llm(MODEL_ID) | StrOutputParser()
+
+
+def cached():
+    return chat_service.get_chain(MODEL_ID, "rag")
+
+
+def report(label: str, seconds: float, iterations: int):
+    print(f"{label:<32} {seconds / iterations * 1e6:10.1f} us/request")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    model_manager._clients[MODEL_ID] = FakeListChatModel(responses=["Two years."])
+
+    print(f"Chain setup ({iterations} iterations)")
+    report("rebuilt per request", timeit.timeit(build_per_request, number=iterations), iterations)
+    report("cached (get_chain)", timeit.timeit(cached, number=iterations), iterations)
+
+    print(f"\nSetup + invoke with a fake model ({iterations} iterations)")
+    report("rebuilt per request", timeit.timeit(lambda: build_per_request().invoke(INPUTS), number=iterations), iterations)
+    report("cached (get_chain)", timeit.timeit(lambda: cached().invoke(INPUTS), number=iterations), iterations)
+
+
+if __name__ == "__main__":
+    main()
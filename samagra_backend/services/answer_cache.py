@@ -0,0 +1,114 @@
+"""
+Semantic cache of RAG answers: a question close enough in meaning to one already answered
+by the same model and prompt over the same document corpus gets the stored answer back
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+
+from services.metrics import metrics
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by (model id, prompt mode, corpus version) and the question's embedding.
+    The mode names the chain whose prompt produced the answer ("rag", "rag_stream"). A lookup
+    hits when the most similar cached question of the same scope reaches
+    similarity_threshold (cosine). Entries expire after ttl_seconds and the least recently
+    used are evicted beyond max_entries. Corpus versions change whenever a store's documents
+    change, so stale answers are never served and simply age out.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, similarity_threshold: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # entry id -> (scope, stored_at, unit vector, question, answer)
+        self._scopes = {}  # (model id, mode, corpus version) -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, model_id: str, mode: str, corpus_version: Hashable, embedding) -> Optional[str]:
+        """Return the answer cached for the most similar question, or None."""
+        vector = _unit(embedding)
+        scope = (model_id, mode, corpus_version)
+        with self._lock:
+            self._expire()
+            best_id, best_similarity = None, -1.0
+            for entry_id in self._scopes.get(scope, ()):
+                similarity = float(np.dot(self._entries[entry_id][2], vector))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None or best_similarity < self.similarity_threshold:
+                self.misses += 1
+                hit = None
+            else:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                hit = self._entries[best_id]
+        if hit is None:
+            metrics.incr(f"{self.name}.misses")
+            return None
+        metrics.incr(f"{self.name}.hits")
+        metrics.observe(f"{self.name}.hit_similarity", best_similarity)
+        print(f"AnswerCache: Hit for a question similar to '{hit[3][:80]}' (similarity {best_similarity:.3f})")
+        return hit[4]
+
+    def set(self, model_id: str, mode: str, corpus_version: Hashable, embedding, question: str, answer: str):
+        scope = (model_id, mode, corpus_version)
+        evicted = 0
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, time.time(), _unit(embedding), question, answer)
+            self._scopes.setdefault(scope, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        if evicted:
+            metrics.incr(f"{self.name}.evictions", evicted)
+
+    def _expire(self):
+        """Drop entries older than the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[1] < cutoff]
+        for entry_id in expired:
+            self._remove(entry_id)
+        if expired:
+            metrics.incr(f"{self.name}.expirations", len(expired))
+
+    def _remove(self, entry_id: int):
+        scope = self._entries.pop(entry_id)[0]
+        ids = self._scopes[scope]
+        ids.discard(entry_id)
+        if not ids:
+            del self._scopes[scope]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def _unit(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
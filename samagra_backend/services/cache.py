@@ -0,0 +1,136 @@
+"""
+Small in-memory LRU cache with optional time-to-live and hit/miss accounting,
+and coalescing of concurrent identical calls
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from services.metrics import metrics
+
+
+class LRUCache:
+    """Thread-safe mapping bounded by max_entries; entries older than ttl_seconds are treated as missing"""
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.incr(f"{self.name}.misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.incr(f"{self.name}.hits")
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.incr(f"{self.name}.evictions", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a key is in flight, other callers (sync or
+    async) wait for its result instead of repeating the work.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.coalesced = 0
+        self._calls = {}  # key -> Future shared by the callers of an in-flight call
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable):
+        """Return (future, is_leader) for key, registering a new call if none is in flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = self._calls[key] = Future()
+                leader = True
+        if not leader:
+            metrics.incr(f"{self.name}.coalesced")
+        return future, leader
+
+    def _settle(self, key: Hashable, future: Future, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def arun(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        # The work runs in its own task so that a cancelled leader (e.g. a client that
+        # disconnected) does not cancel it for the callers waiting on the same key
+        task = asyncio.ensure_future(factory())
+
+        def settle(done: asyncio.Task):
+            if done.cancelled():
+                self._settle(key, future, error=asyncio.CancelledError())
+            elif done.exception() is not None:
+                self._settle(key, future, error=done.exception())
+            else:
+                self._settle(key, future, done.result())
+
+        task.add_done_callback(settle)
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
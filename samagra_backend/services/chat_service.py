@@ -1,28 +1,113 @@
 import asyncio
 import base64
-import json
+import math
+import re
+from contextlib import aclosing
 from typing import Optional, AsyncGenerator
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from core.config import settings
-from services.rag_service import document_store, process_uploaded_document, process_uploaded_image
+from services.rag_service import (
+    LEXICAL_MATCH,
+    DocumentStore,
+    StoreCapacityError,
+    aprocess_uploaded_document,
+    aprocess_uploaded_image,
+    content_hash,
+    run_in_ingest_executor,
+    run_in_search_executor,
+)
+from services.store_registry import store_registry
 from services.model_manager import model_manager, SYSTEM_INSTRUCTION
+from services.metrics import TurnTimer, metrics
+from services.context_builder import CHARS_PER_TOKEN, build_context, compress_chunks
+from services.answer_cache import SemanticAnswerCache
+from services.sse import JSON_FORMAT, coalesce_frames
+
+# Words per SSE frame when a cached answer is replayed
+ANSWER_REPLAY_WORDS_PER_FRAME = 4
+
+# Global cache of RAG answers, keyed by model, corpus version and question embedding
+answer_cache = SemanticAnswerCache(
+    "answer_cache",
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
 
 GENERAL_CHAT_PROMPT = ChatPromptTemplate.from_messages([
     ("system", SYSTEM_INSTRUCTION),
     ("human", "{message}"),
 ])
 
+# RAG prompt of /chat
+RAG_PROMPT = PromptTemplate.from_template(f"""
+    {SYSTEM_INSTRUCTION}
 
-def _invoke_general_chat(message: str):
-    chain = GENERAL_CHAT_PROMPT | get_llm()
-    return chain.invoke({"message": message})
+    Ground your reply in the provided context when it exists. The context may include:
+    - Text extracted from documents (PDFs, text files)
+    - Text extracted from images via optical character recognition (OCR)
 
+    When the user references "this image" or "this document", treat the context below as the extracted content of that asset.
+    If the context comes from an image, describe what the extracted text reveals about the visual.
 
-def _general_chat_astream(message: str):
-    chain = GENERAL_CHAT_PROMPT | get_llm()
-    return chain.astream({"message": message})
+    Context:
+    {{context}}
+
+    Question: {{question}}
+
+    If the context does not contain the information needed, offer a concise clarification request instead of guessing.
+    """)
+
+# RAG prompt of /chat/stream
+RAG_STREAM_PROMPT = PromptTemplate.from_template("""
+    You are a helpful assistant. Answer the question based on the following context, which may include:
+    - Text extracted from documents (PDFs, text files)
+    - Text extracted from images via OCR (optical character recognition)
+    
+    When asked about "this image" or "this document", the context below represents the content extracted from it.
+    If the context contains text that was extracted from an image, treat that as describing what was visible in the image.
+    
+    Context:
+    {context}
+
+    Question: {question}
+    
+    Provide a detailed answer based on the context. If the question is about an image and the context contains extracted text,
+    describe what text/content was found in the image. If the context does not cover the question, say so briefly instead of guessing.
+    """)
+
+# How each chain mode is composed around a model client
+_CHAIN_BUILDERS = {
+    "general": lambda llm: GENERAL_CHAT_PROMPT | llm,
+    "rag": lambda llm: RAG_PROMPT | llm | StrOutputParser(),
+    "rag_stream": lambda llm: RAG_STREAM_PROMPT | llm | StrOutputParser(),
+}
+
+# Compiled chains per (model id, mode), with the client they were built around
+_chains = {}
+
+
+def get_chain(model_id: str, mode: str):
+    """
+    Compiled chain of a mode ("general", "rag" or "rag_stream") for a model, built once and
+    reused. Chains hold no per-request state (context and question are inputs), so the only
+    thing that invalidates one is its model's client being replaced.
+    """
+    llm = get_llm(model_id)
+    entry = _chains.get((model_id, mode))
+    if entry is None or entry[0] is not llm:
+        entry = _chains[(model_id, mode)] = (llm, _CHAIN_BUILDERS[mode](llm))
+        metrics.incr("chains.built")
+    return entry[1]
+
+
+async def _ainvoke_general_chat(message: str, model_id: str):
+    return await get_chain(model_id, "general").ainvoke({"message": message})
+
+
+def _general_chat_astream(message: str, model_id: str):
+    return get_chain(model_id, "general").astream({"message": message})
 
 try:
     import google.generativeai as genai  # type: ignore
@@ -34,27 +119,26 @@ except ImportError:
     HAS_GOOGLE_GENAI = False
 
 # Get the language model from model manager
-def get_llm():
-    """Get the current language model instance"""
-    return model_manager.get_llm()
+def get_llm(model_id: Optional[str] = None):
+    """Get the pooled language model client of model_id (the default model if omitted)"""
+    return model_manager.get_llm(model_id)
 
 
-async def _generate_image_response_stream(message: str) -> AsyncGenerator[str, None]:
-    """Generate an image using the Gemini image model and stream the result."""
+async def _generate_image_response_stream(message: str, model_id: str) -> AsyncGenerator[dict, None]:
+    """Generate an image using the Gemini image model and stream the result as SSE payloads."""
     if not HAS_GOOGLE_GENAI:
         warning = (
             "Image generation support is not available on the server. "
             "Install the 'google-generativeai' package to enable it."
         )
         print(f"WARN: {warning}")
-        yield f"data: {json.dumps({'content': warning, 'type': 'text'})}\n\n"
-        yield f"data: {json.dumps({'done': True})}\n\n"
+        yield {'content': warning, 'type': 'text'}
+        yield {'done': True}
         return
 
     loop = asyncio.get_running_loop()
 
     def _generate_sync():
-        model_id = model_manager.get_current_model_id()
         print(f"DEBUG: Calling GenerativeModel.generate_content for image with model '{model_id}'")
         model = genai.GenerativeModel(model_id)
         contents = [{
@@ -71,8 +155,8 @@ async def _generate_image_response_stream(message: str) -> AsyncGenerator[str, N
     except Exception as exc:
         error_msg = f"Image generation failed: {exc}"
         print(f"ERROR: {error_msg}")
-        yield f"data: {json.dumps({'content': error_msg, 'type': 'text'})}\n\n"
-        yield f"data: {json.dumps({'done': True})}\n\n"
+        yield {'content': error_msg, 'type': 'text'}
+        yield {'done': True}
         return
 
     text_parts = []
@@ -116,7 +200,7 @@ async def _generate_image_response_stream(message: str) -> AsyncGenerator[str, N
 
     if text_parts:
         for text in text_parts:
-            yield f"data: {json.dumps({'content': text, 'type': 'text'})}\n\n"
+            yield {'content': text, 'type': 'text'}
 
     if image_parts:
         for index, img in enumerate(image_parts, start=1):
@@ -128,29 +212,144 @@ async def _generate_image_response_stream(message: str) -> AsyncGenerator[str, N
                 'type': 'image',
                 'mime_type': img['mime_type'],
             }
-            yield f"data: {json.dumps(payload)}\n\n"
+            yield payload
     else:
         print("DEBUG: No image data returned by the Gemini image model")
         if not text_parts:
             fallback = "The image model did not return an image. Please try rephrasing your prompt."
-            yield f"data: {json.dumps({'content': fallback, 'type': 'text'})}\n\n"
+            yield {'content': fallback, 'type': 'text'}
+
+    yield {'done': True}
+
+def _format_docs(docs) -> str:
+    """Join retrieved chunks into the context block of the RAG prompt."""
+    return "\n\n".join(doc.page_content for doc in docs)
 
-    yield f"data: {json.dumps({'done': True})}\n\n"
 
-def generate_ai_response(
+def _route_retrieval(scored_docs, timer: TurnTimer, force_rag: bool = False):
+    """
+    Decide, before any generation, whether the turn is answered from documents.
+    Returns the (chunk, score) pairs to build the context from, or None when the
+    best similarity is below RAG_RELEVANCE_THRESHOLD (content indexed in this
+    same turn, e.g. an inline image, always uses RAG). A decisive lexical match
+    also uses RAG: its chunks contain every identifier the question names, and
+    its scores are relative BM25 scores that the threshold does not apply to.
+    """
+    relevant_docs = [(doc, score) for doc, score in scored_docs if doc.page_content.strip()]
+    if relevant_docs and relevant_docs[0][0].metadata.get(LEXICAL_MATCH):
+        timer.details["lexical_match"] = True
+        print(f"Decisive lexical match in {len(relevant_docs)} documents; answering from documents")
+        return relevant_docs
+    best_score = max((score for _, score in scored_docs), default=None)
+    timer.details["best_score"] = best_score
+    print(f"Found {len(relevant_docs)} relevant documents (best score: {best_score})")
+
+    if not relevant_docs:
+        return None
+    if best_score < settings.RAG_RELEVANCE_THRESHOLD and not force_rag:
+        print(f"Best score below threshold {settings.RAG_RELEVANCE_THRESHOLD}; routing to general chat")
+        return None
+    return relevant_docs
+
+
+def _pack_context(scored_docs, question: str, model_id: str, timer: TurnTimer) -> str:
+    """
+    Pack the relevant chunks into the model's context token budget (after optional
+    extractive compression) and record the savings.
+    """
+    if settings.CONTEXT_COMPRESSION_ENABLED:
+        with timer.stage("compression"):
+            scored_docs, compression = compress_chunks(
+                scored_docs, question, settings.CONTEXT_COMPRESSION_MAX_SENTENCES
+            )
+        timer.details["compression"] = compression
+        metrics.observe("compression.ratio", compression["ratio"])
+        print(f"Compressed context to {compression['ratio']:.0%} of {compression['chars_in']} characters")
+
+    with timer.stage("context"):
+        docs, report = build_context(
+            scored_docs,
+            token_budget=model_manager.get_context_token_budget(model_id),
+            min_relative_score=settings.CONTEXT_MIN_RELATIVE_SCORE,
+            duplicate_containment=settings.CONTEXT_DUPLICATE_CONTAINMENT,
+        )
+    timer.details["context"] = report
+    metrics.observe("context.tokens_saved", report["tokens_saved"])
+    print(f"Packed {report['chunks_packed']}/{report['chunks_retrieved']} chunks "
+          f"({report['tokens_packed']} tokens, {report['tokens_saved']} saved)")
+    for i, doc in enumerate(docs):
+        print(f"Doc {i+1}: {doc.page_content[:200]}...")
+    return _format_docs(docs)
+
+
+async def _lookup_answer(document_store: DocumentStore, message: str, model_id: str, mode: str, timer: TurnTimer):
+    """
+    Look message up in the answer cache for model_id and the prompt of chain mode over the
+    store's current corpus. Returns (answer or None, query embedding to store the answer under).
+    Skipped when retrieval would not embed the query (a decisive lexical match), so the cache
+    never adds an embedding round trip to those turns.
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None, None
+    if await run_in_search_executor(document_store.has_decisive_lexical_match, message):
+        return None, None
+    with timer.stage("answer_cache"):
+        embedding = await document_store.aembed_query(message)
+        answer = answer_cache.get(model_id, mode, document_store.version, embedding)
+    timer.details["answer_cache"] = "hit" if answer is not None else "miss"
+    return answer, embedding
+
+
+def _replay_chunks(answer: str):
+    """Split a cached answer into text chunks, so it is framed like a live generation."""
+    words = re.split(r"(?<=\s)(?=\S)", answer)
+    for i in range(0, len(words), ANSWER_REPLAY_WORDS_PER_FRAME):
+        chunk = "".join(words[i:i + ANSWER_REPLAY_WORDS_PER_FRAME])
+        yield {'content': chunk}
+
+
+async def generate_ai_response(
     message: str,
     document_base64: Optional[str] = None,
     document_filename: Optional[str] = None,
     image_base64: Optional[str] = None,
     image_filename: Optional[str] = None,
+    session_id: Optional[str] = None,
+    model_id: Optional[str] = None,
 ) -> str:
     """
     This is the core function that gets a response from the AI model.
     It is now "context-aware" and will use the RAG pipeline if a document
     has been processed or if document content is provided via base64.
+    Documents are read from and indexed into the namespace of session_id, and
+    model_id picks the model for this turn only (the default model if omitted).
+    Model calls are awaited (ainvoke) and base64 decoding and ingestion run on the
+    ingestion pool, so the event loop is never blocked by a turn.
+    Stage timings for the turn are recorded in the metrics registry.
     """
-    global document_store
-    
+    timer = TurnTimer("chat")
+    model_id = model_manager.resolve_model_id(model_id)
+    timer.details["model"] = model_id
+    try:
+        # The lease keeps the namespace loaded until the turn is answered
+        async with store_registry.lease(session_id) as document_store:
+            return await _generate_ai_response(
+                message, document_base64, document_filename, image_base64, image_filename, document_store, model_id, timer
+            )
+    finally:
+        timer.finish()
+
+
+async def _generate_ai_response(
+    message: str,
+    document_base64: Optional[str],
+    document_filename: Optional[str],
+    image_base64: Optional[str],
+    image_filename: Optional[str],
+    document_store: DocumentStore,
+    model_id: str,
+    timer: TurnTimer,
+) -> str:
     print(f"generate_ai_response called with: message='{message[:100]}...', has_document={document_base64 is not None}")
     current_retriever = document_store.get_retriever()
     print(f"Current retriever state: {current_retriever is not None}")
@@ -159,12 +358,20 @@ def generate_ai_response(
     if document_base64:
         print(f"Processing document from base64 content (filename: {document_filename})")
         try:
-            # Decode the base64 content
-            document_bytes = base64.b64decode(document_base64)
+            # Decoding and hashing large uploads is CPU work, so it runs on the ingestion pool
+            document_bytes = await run_in_ingest_executor(base64.b64decode, document_base64)
             print(f"Decoded document size: {len(document_bytes)} bytes")
             
+            # Skip ingestion if these exact bytes are already indexed
+            file_hash = await run_in_ingest_executor(content_hash, document_bytes)
+            if document_store.find_file_by_hash(file_hash):
+                print("Document already indexed; skipping ingestion")
+                files_info = ", ".join(document_store.get_file_list())
+                return f"Your document '{document_filename}' is already indexed, so there was nothing new to process. I have access to: {files_info}. What would you like to know?"
+            
             # Process the document through RAG pipeline
-            success = process_uploaded_document(document_bytes)
+            with timer.stage("ingestion"):
+                success = await aprocess_uploaded_document(document_store, document_bytes, document_filename, file_hash)
             print(f"Document processing result: {success}")
             current_retriever = document_store.get_retriever()
             print(f"Vector store retriever after processing: {current_retriever is not None}")
@@ -179,18 +386,24 @@ def generate_ai_response(
             else:
                 print("Failed to process document from base64")
                 return "Sorry, I had trouble processing your document. Please try again."
+        except StoreCapacityError as e:
+            print(f"Document does not fit in the session's store: {e}")
+            return "Sorry, this chat has reached its document storage limit. Please clear some documents and try again."
         except Exception as e:
             print(f"Error processing base64 document: {e}")
             return "Sorry, I had trouble processing your document. Please try again."
 
     # If an image is provided inline, attempt to OCR and process it, then continue to answer the question via RAG
+    image_indexed = False
     if image_base64:
         print(f"Processing image from base64 content (filename: {image_filename})")
         try:
-            image_bytes = base64.b64decode(image_base64)
-            ocr_text = process_uploaded_image(image_bytes, image_filename)
+            image_bytes = await run_in_ingest_executor(base64.b64decode, image_base64)
+            with timer.stage("ingestion"):
+                ocr_text = await aprocess_uploaded_image(document_store, image_bytes, image_filename)
             if ocr_text:
                 print(f"Image processed successfully: {len(ocr_text)} characters extracted and indexed")
+                image_indexed = True
                 # Refresh retriever and continue below to RAG flow using the user's message
                 current_retriever = document_store.get_retriever()
                 print(f"Image text indexed into vector store: {current_retriever is not None}")
@@ -206,8 +419,10 @@ def generate_ai_response(
     if current_retriever is None:
         # If no document or image is uploaded, behave as a general chatbot
         print("No document or image loaded. Using general conversation mode.")
+        timer.mode = "general"
         try:
-            ai_response = _invoke_general_chat(message)
+            with timer.stage("generation"):
+                ai_response = await _ainvoke_general_chat(message, model_id)
             return ai_response.content
         except Exception as e:
             print(f"Error calling AI model: {e}")
@@ -217,68 +432,39 @@ def generate_ai_response(
         print("Document/Image loaded. Using RAG chain for Q&A.")
         print(f"Question: {message}")
 
-        # 2. Create a prompt template for RAG
-        template = f"""
-        {SYSTEM_INSTRUCTION}
-
-        Ground your reply in the provided context when it exists. The context may include:
-        - Text extracted from documents (PDFs, text files)
-        - Text extracted from images via optical character recognition (OCR)
-
-        When the user references "this image" or "this document", treat the context below as the extracted content of that asset.
-        If the context comes from an image, describe what the extracted text reveals about the visual.
-
-        Context:
-        {{context}}
-
-        Question: {{question}}
-
-        If the context does not contain the information needed, offer a concise clarification request instead of guessing. Only respond with "NO_ANSWER_IN_DOCUMENT" when the context is empty or unrelated.
-        """
-        prompt = PromptTemplate.from_template(template)
-
-        # 3. Create the RAG chain using LangChain Expression Language (LCEL)
-        rag_chain = (
-            {"context": current_retriever, "question": RunnablePassthrough()}
-            | prompt
-            | get_llm()
-            | StrOutputParser()
-        )
-
-        # 4. Invoke the RAG chain with the user's message
+        # 2. Invoke the RAG chain with the user's message (context is retrieved once and passed in)
+        timer.mode = "rag"
         try:
+            # Repeated questions over an unchanged corpus are answered from the answer cache
+            corpus_version = document_store.version
+            cached_answer, query_embedding = await _lookup_answer(document_store, message, model_id, "rag", timer)
+            if cached_answer is not None:
+                return cached_answer
+
             print("Invoking RAG chain...")
-            # First, let's test the retriever directly
-            relevant_docs = current_retriever.invoke(message)
-            print(f"Found {len(relevant_docs)} relevant documents:")
-            for i, doc in enumerate(relevant_docs):
-                print(f"Doc {i+1}: {doc.page_content[:200]}...")
+            with timer.stage("retrieval"):
+                scored_docs = await document_store.asearch_with_scores(message)
+            relevant_docs = _route_retrieval(scored_docs, timer, force_rag=image_indexed)
             
-            # Check if any relevant documents were found
-            if not relevant_docs or all(len(doc.page_content.strip()) == 0 for doc in relevant_docs):
-                print("No relevant documents found, falling back to general chat")
-                # Fall back to general chat mode
+            # Answer from general knowledge when no sufficiently relevant chunk was found
+            if relevant_docs is None:
+                print("No relevant documents found, using general chat")
+                timer.mode = "general"
                 try:
-                    ai_response = _invoke_general_chat(message)
+                    with timer.stage("generation"):
+                        ai_response = await _ainvoke_general_chat(message, model_id)
                     return ai_response.content
                 except Exception as e:
-                    print(f"Error in fallback general chat: {e}")
+                    print(f"Error in general chat: {e}")
                     return "Sorry, I'm having trouble thinking right now. Please try again later."
-            
-            # Now invoke the full RAG chain
-            result = rag_chain.invoke(message)
+
+            # Now invoke the full RAG chain over the documents retrieved above
+            context = _pack_context(relevant_docs, message, model_id, timer)
+            with timer.stage("generation"):
+                result = await get_chain(model_id, "rag").ainvoke({"context": context, "question": message})
             print(f"RAG chain result: {result[:200]}...")
-            
-            # Check if the model couldn't find the answer in the document
-            if "NO_ANSWER_IN_DOCUMENT" in result:
-                print("No answer found in document, falling back to general chat")
-                # Fall back to general chat mode
-                try:
-                    ai_response = _invoke_general_chat(message)
-                    return ai_response.content
-                except Exception as e:
-                    print(f"Error in fallback general chat: {e}")
-                    return "Sorry, I'm having trouble thinking right now. Please try again later."
+            if query_embedding is not None and result:
+                answer_cache.set(model_id, "rag", corpus_version, query_embedding, message, result)
             
             return result
         except Exception as e:
@@ -293,7 +479,8 @@ def generate_ai_response(
             # Fall back to general chat mode in case of error
             print("RAG chain failed, falling back to general chat")
             try:
-                ai_response = _invoke_general_chat(message)
+                with timer.stage("fallback_generation"):
+                    ai_response = await _ainvoke_general_chat(message, model_id)
                 return ai_response.content
             except Exception as fallback_error:
                 print(f"Fallback general chat also failed: {fallback_error}")
@@ -306,13 +493,78 @@ async def generate_ai_response_stream(
     document_filename: Optional[str] = None,
     image_base64: Optional[str] = None,
     image_filename: Optional[str] = None,
+    session_id: Optional[str] = None,
+    model_id: Optional[str] = None,
+    stream_format: Optional[str] = None,
 ) -> AsyncGenerator[str, None]:
     """
     Streaming version of generate_ai_response that yields tokens as they are generated.
-    Yields Server-Sent Events formatted strings.
+    Yields Server-Sent Events formatted strings. model_id applies to this turn only.
+    Text chunks are coalesced per SSE_FLUSH_MS / SSE_FLUSH_BYTES (the first one is sent
+    at once), and stream_format selects the "json" (default) or "compact" frame encoding.
     """
-    global document_store
-    
+    timer = TurnTimer("chat/stream")
+    model_id = model_manager.resolve_model_id(model_id)
+    timer.details["model"] = model_id
+    timer.details["answer_chars"] = 0
+    try:
+        # The lease keeps the namespace loaded until the stream ends
+        async with store_registry.lease(session_id) as document_store:
+            payloads = _generate_ai_response_stream(
+                message, document_base64, document_filename, image_base64, image_filename, document_store, model_id, timer
+            )
+            frames = coalesce_frames(
+                payloads,
+                flush_ms=settings.SSE_FLUSH_MS,
+                flush_bytes=settings.SSE_FLUSH_BYTES,
+                stream_format=stream_format or JSON_FORMAT,
+            )
+            # Closing the frames also closes the model stream, so a cancelled turn stops generating at once
+            async with aclosing(frames):
+                async for frame in frames:
+                    yield frame
+    except (GeneratorExit, asyncio.CancelledError):
+        _record_cancellation(timer)
+        raise
+    else:
+        if _generated_answer(timer):
+            metrics.observe("chat.stream.answer_tokens", math.ceil(timer.details["answer_chars"] / CHARS_PER_TOKEN))
+    finally:
+        timer.finish()
+
+
+def _generated_answer(timer: TurnTimer) -> bool:
+    """True for turns that stream a model-generated text answer (not ingestion, images or cache replays)."""
+    return timer.mode in ("rag", "general") and timer.details.get("answer_cache") != "hit"
+
+
+def _record_cancellation(timer: TurnTimer):
+    """
+    Count a stream cancelled by its client and estimate the completion tokens saved: the
+    average length of completed answers minus what was already generated.
+    """
+    metrics.incr("chat.stream.cancelled")
+    timer.details["cancelled"] = True
+    if not _generated_answer(timer):
+        return
+    streamed = math.ceil(timer.details["answer_chars"] / CHARS_PER_TOKEN)
+    expected = metrics.mean("chat.stream.answer_tokens") or settings.STREAM_EXPECTED_ANSWER_TOKENS
+    saved = max(0, round(expected - streamed))
+    timer.details["tokens_saved"] = saved
+    metrics.incr("chat.stream.tokens_saved", saved)
+    print(f"Stream cancelled by the client after ~{streamed} tokens (~{saved} saved)")
+
+
+async def _generate_ai_response_stream(
+    message: str,
+    document_base64: Optional[str],
+    document_filename: Optional[str],
+    image_base64: Optional[str],
+    image_filename: Optional[str],
+    document_store: DocumentStore,
+    model_id: str,
+    timer: TurnTimer,
+) -> AsyncGenerator[dict, None]:
     print(f"generate_ai_response_stream called with: message='{message[:100]}...', has_document={document_base64 is not None}")
     current_retriever = document_store.get_retriever()
     print(f"Current retriever state: {current_retriever is not None}")
@@ -321,10 +573,21 @@ async def generate_ai_response_stream(
     if document_base64:
         print(f"Processing document from base64 content (filename: {document_filename})")
         try:
-            document_bytes = base64.b64decode(document_base64)
+            # Decoding and hashing large uploads is CPU work, so it runs on the ingestion pool
+            document_bytes = await run_in_ingest_executor(base64.b64decode, document_base64)
             print(f"Decoded document size: {len(document_bytes)} bytes")
             
-            success = process_uploaded_document(document_bytes)
+            # Skip ingestion if these exact bytes are already indexed
+            file_hash = await run_in_ingest_executor(content_hash, document_bytes)
+            if document_store.find_file_by_hash(file_hash):
+                print("Document already indexed; skipping ingestion")
+                files_info = ", ".join(document_store.get_file_list())
+                confirmation = f"Your document '{document_filename}' is already indexed, so there was nothing new to process. I have access to: {files_info}. What would you like to know?"
+                yield {'content': confirmation, 'done': True}
+                return
+            
+            with timer.stage("ingestion"):
+                success = await aprocess_uploaded_document(document_store, document_bytes, document_filename, file_hash)
             print(f"Document processing result: {success}")
             current_retriever = document_store.get_retriever()
             print(f"Vector store retriever after processing: {current_retriever is not None}")
@@ -335,25 +598,33 @@ async def generate_ai_response_stream(
                 files_info = ", ".join(file_list)
                 confirmation = f"Perfect! I've successfully processed your document '{document_filename}'. Now I have access to: {files_info}. I'm ready to answer questions about any of this content. What would you like to know?"
                 # Send as complete message
-                yield f"data: {json.dumps({'content': confirmation, 'done': True})}\n\n"
+                yield {'content': confirmation, 'done': True}
                 return
             else:
                 print("Failed to process document from base64")
-                yield f"data: {json.dumps({'content': 'Sorry, I had trouble processing your document. Please try again.', 'done': True})}\n\n"
+                yield {'content': 'Sorry, I had trouble processing your document. Please try again.', 'done': True}
                 return
+        except StoreCapacityError as e:
+            print(f"Document does not fit in the session's store: {e}")
+            limit_message = "Sorry, this chat has reached its document storage limit. Please clear some documents and try again."
+            yield {'content': limit_message, 'done': True}
+            return
         except Exception as e:
             print(f"Error processing base64 document: {e}")
-            yield f"data: {json.dumps({'content': 'Sorry, I had trouble processing your document. Please try again.', 'done': True})}\n\n"
+            yield {'content': 'Sorry, I had trouble processing your document. Please try again.', 'done': True}
             return
 
     # If an image is provided inline, attempt to OCR and process it
+    image_indexed = False
     if image_base64:
         print(f"Processing image from base64 content (filename: {image_filename})")
         try:
-            image_bytes = base64.b64decode(image_base64)
-            ocr_text = process_uploaded_image(image_bytes, image_filename)
+            image_bytes = await run_in_ingest_executor(base64.b64decode, image_base64)
+            with timer.stage("ingestion"):
+                ocr_text = await aprocess_uploaded_image(document_store, image_bytes, image_filename)
             if ocr_text:
                 print(f"Image processed successfully: {len(ocr_text)} characters extracted and indexed")
+                image_indexed = True
                 current_retriever = document_store.get_retriever()
                 print(f"Image text indexed into vector store: {current_retriever is not None}")
             else:
@@ -367,141 +638,112 @@ async def generate_ai_response_stream(
     
     try:
         if current_retriever is None:
-            if model_manager.is_image_generation_model():
+            if model_manager.is_image_generation_model(model_id):
                 print("Image generation model active. Using direct image generation pipeline.")
-                async for chunk in _generate_image_response_stream(message):
-                    yield chunk
+                timer.mode = "image"
+                with timer.stage("generation"):
+                    async for chunk in _generate_image_response_stream(message, model_id):
+                        yield chunk
                 return
             # If no document or image is uploaded, behave as a general chatbot
             print("No document or image loaded. Using general conversation mode (streaming).")
-            async for chunk in _general_chat_astream(message):
-                if chunk.content:
-                    # Handle both text and multimodal content (for image generation)
-                    content = chunk.content
-                    print(f"DEBUG: Chunk content type: {type(content)}, value: {content[:200] if isinstance(content, str) else content}")
-                    
-                    # If content is a list (multimodal response with images), extract text and image data
-                    if isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict):
-                                # Check if it's text or image data
-                                if 'text' in item:
-                                    preview = item['text'][:120].replace('\n', ' ')
-                                    print(f"DEBUG: Streaming text chunk -> {preview}...")
-                                    data = f"data: {json.dumps({'content': item['text'], 'type': 'text'})}\n\n"
-                                    yield data
-                                elif 'image' in item or 'inline_data' in item:
-                                    # Extract inline image data for streaming
-                                    inline_data = None
-                                    if 'inline_data' in item and isinstance(item['inline_data'], dict):
-                                        inline_data = item['inline_data']
-                                    elif 'image' in item and isinstance(item['image'], dict):
-                                        inline_data = item['image'].get('inline_data') if isinstance(item['image'].get('inline_data'), dict) else None
-
-                                    if inline_data:
-                                        image_base64 = inline_data.get('data')
-                                        mime_type = inline_data.get('mime_type', 'image/png')
-                                        if image_base64:
-                                            print(
-                                                f"DEBUG: Streaming image chunk -> mime={mime_type}, size={len(image_base64)} chars"
-                                            )
-                                            payload = {
-                                                'content': image_base64,
-                                                'type': 'image',
-                                                'mime_type': mime_type,
-                                            }
-                                            data = f"data: {json.dumps(payload)}\n\n"
-                                            yield data
-                                        else:
-                                            print("DEBUG: Inline image data missing 'data' field")
-                                    else:
-                                        print(f"DEBUG: Unable to locate inline image data in item: {item}")
-                            elif isinstance(item, str):
-                                preview = item[:120].replace('\n', ' ')
-                                print(f"DEBUG: Streaming text string -> {preview}...")
-                                data = f"data: {json.dumps({'content': item, 'type': 'text'})}\n\n"
-                                yield data
-                    else:
-                        # Regular text content
-                        preview = str(content)[:120].replace('\n', ' ')
-                        print(f"DEBUG: Streaming plain text -> {preview}...")
-                        data = f"data: {json.dumps({'content': content, 'type': 'text'})}\n\n"
-                        yield data
+            timer.mode = "general"
+            with timer.stage("generation"):
+                stream = _general_chat_astream(message, model_id)
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if chunk.content:
+                            # Handle both text and multimodal content (for image generation)
+                            content = chunk.content
                     
-                    # Force flush by yielding empty byte to trigger send
-                    await __import__('asyncio').sleep(0)
-            yield f"data: {json.dumps({'done': True})}\n\n"
+                            # If content is a list (multimodal response with images), extract text and image data
+                            if isinstance(content, list):
+                                for item in content:
+                                    if isinstance(item, dict):
+                                        # Check if it's text or image data
+                                        if 'text' in item:
+                                            timer.details["answer_chars"] += len(item['text'])
+                                            yield {'content': item['text'], 'type': 'text'}
+                                        elif 'image' in item or 'inline_data' in item:
+                                            # Extract inline image data for streaming
+                                            inline_data = None
+                                            if 'inline_data' in item and isinstance(item['inline_data'], dict):
+                                                inline_data = item['inline_data']
+                                            elif 'image' in item and isinstance(item['image'], dict):
+                                                inline_data = item['image'].get('inline_data') if isinstance(item['image'].get('inline_data'), dict) else None
+
+                                            if inline_data:
+                                                image_base64 = inline_data.get('data')
+                                                mime_type = inline_data.get('mime_type', 'image/png')
+                                                if image_base64:
+                                                    payload = {
+                                                        'content': image_base64,
+                                                        'type': 'image',
+                                                        'mime_type': mime_type,
+                                                    }
+                                                    yield payload
+                                                else:
+                                                    print("DEBUG: Inline image data missing 'data' field")
+                                            else:
+                                                print(f"DEBUG: Unable to locate inline image data in item: {item}")
+                                    elif isinstance(item, str):
+                                        timer.details["answer_chars"] += len(item)
+                                        yield {'content': item, 'type': 'text'}
+                            else:
+                                # Regular text content
+                                timer.details["answer_chars"] += len(content)
+                                yield {'content': content, 'type': 'text'}
+            yield {'done': True}
         else:
             # If a document or image is uploaded, use the RAG chain
             print("Document/Image loaded. Using RAG chain for Q&A (streaming).")
             print(f"Question: {message}")
 
-            # Create a prompt template for RAG
-            template = """
-            You are a helpful assistant. Answer the question based on the following context, which may include:
-            - Text extracted from documents (PDFs, text files)
-            - Text extracted from images via OCR (optical character recognition)
-            
-            When asked about "this image" or "this document", the context below represents the content extracted from it.
-            If the context contains text that was extracted from an image, treat that as describing what was visible in the image.
-            
-            Context:
-            {context}
-
-            Question: {question}
-            
-            Provide a detailed answer based on the context. If the question is about an image and the context contains extracted text,
-            describe what text/content was found in the image. Only respond with "NO_ANSWER_IN_DOCUMENT" if the context is completely 
-            unrelated or empty.
-            """
-            prompt = PromptTemplate.from_template(template)
-
-            # Create the RAG chain
-            rag_chain = (
-                {"context": current_retriever, "question": RunnablePassthrough()}
-                | prompt
-                | get_llm()
-                | StrOutputParser()
-            )
+            # Retrieve and route before generating, so each turn makes a single LLM call
+            timer.mode = "rag"
+            # Repeated questions over an unchanged corpus are replayed from the answer cache
+            corpus_version = document_store.version
+            cached_answer, query_embedding = await _lookup_answer(document_store, message, model_id, "rag_stream", timer)
+            if cached_answer is not None:
+                for chunk in _replay_chunks(cached_answer):
+                    yield chunk
+                yield {'done': True}
+                return
 
-            # Check for relevant documents first
-            relevant_docs = current_retriever.invoke(message)
-            print(f"Found {len(relevant_docs)} relevant documents")
+            with timer.stage("retrieval"):
+                scored_docs = await document_store.asearch_with_scores(message)
+            relevant_docs = _route_retrieval(scored_docs, timer, force_rag=image_indexed)
             
-            if not relevant_docs or all(len(doc.page_content.strip()) == 0 for doc in relevant_docs):
-                print("No relevant documents found, falling back to general chat (streaming)")
-                async for chunk in _general_chat_astream(message):
-                    if chunk.content:
-                        data = f"data: {json.dumps({'content': chunk.content})}\n\n"
-                        yield data
-                        await __import__('asyncio').sleep(0)
-                yield f"data: {json.dumps({'done': True})}\n\n"
+            if relevant_docs is None:
+                print("No relevant documents found, using general chat (streaming)")
+                timer.mode = "general"
+                with timer.stage("generation"):
+                    stream = _general_chat_astream(message, model_id)
+                    async with aclosing(stream):
+                        async for chunk in stream:
+                            if chunk.content:
+                                timer.details["answer_chars"] += len(chunk.content)
+                                yield {'content': chunk.content}
+                yield {'done': True}
                 return
             
             # Stream the RAG chain result
             print("Streaming RAG chain result...")
-            full_response = ""
-            async for chunk in rag_chain.astream(message):
-                if chunk:
-                    full_response += chunk
-                    data = f"data: {json.dumps({'content': chunk})}\n\n"
-                    yield data
-                    # Small delay to allow flushing
-                    await __import__('asyncio').sleep(0)
-            
-            # Check if the model couldn't find the answer in the document
-            if "NO_ANSWER_IN_DOCUMENT" in full_response:
-                print("No answer found in document, falling back to general chat (streaming)")
-                # Clear the NO_ANSWER response
-                yield f"data: {json.dumps({'content': '', 'clear': True})}\n\n"
-                # Stream general chat response
-                async for chunk in _general_chat_astream(message):
-                    if chunk.content:
-                        data = f"data: {json.dumps({'content': chunk.content})}\n\n"
-                        yield data
-                        await __import__('asyncio').sleep(0)
+            context = _pack_context(relevant_docs, message, model_id, timer)
+            answer_parts = []
+            with timer.stage("generation"):
+                stream = get_chain(model_id, "rag_stream").astream({"context": context, "question": message})
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if chunk:
+                            answer_parts.append(chunk)
+                            timer.details["answer_chars"] += len(chunk)
+                            yield {'content': chunk}
+            # Only answers streamed to completion are cached
+            if query_embedding is not None and answer_parts:
+                answer_cache.set(model_id, "rag_stream", corpus_version, query_embedding, message, "".join(answer_parts))
             
-            yield f"data: {json.dumps({'done': True})}\n\n"
+            yield {'done': True}
             
     except Exception as e:
         print("\n" + "="*50)
@@ -512,5 +754,5 @@ async def generate_ai_response_stream(
         print("="*50 + "\n")
         
         # Send error message
-        yield f"data: {json.dumps({'content': 'Sorry, I encountered an error. Please try again.', 'done': True, 'error': True})}\n\n"
+        yield {'content': 'Sorry, I encountered an error. Please try again.', 'done': True, 'error': True}
 
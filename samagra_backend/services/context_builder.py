@@ -0,0 +1,113 @@
+"""
+Packs retrieved chunks into a model's prompt token budget, optionally compressing each
+chunk to its sentences that overlap the question
+"""
+import math
+import re
+from typing import List, Tuple
+
+from langchain.schema import Document
+
+from services.lexical_index import shingles, tokenize
+
+# Rough characters per token for Gemini on English text; counting exactly would need an API call
+CHARS_PER_TOKEN = 4
+
+# Sentence boundaries: end punctuation followed by whitespace, or line breaks
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Question words that say nothing about which sentence answers it
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or please "
+    "tell the this that to was what when where which who why will with you your".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def build_context(
+    scored_docs: List[Tuple[Document, float]],
+    token_budget: int,
+    min_relative_score: float,
+    duplicate_containment: float,
+):
+    """
+    Choose the retrieved chunks (best ranked first) that go into the prompt:
+    chunks scoring below min_relative_score x the best score are dropped (the top-ranked
+    chunk is always kept), as are chunks whose word shingles are mostly contained in an
+    already chosen one (e.g. overlapping neighbours), and the rest are packed in rank
+    order while they fit in token_budget.
+    Returns (docs, report); the report compares the tokens of every retrieved chunk with
+    the tokens packed.
+    """
+    best_score = max((score for _, score in scored_docs), default=0.0)
+    packed = []
+    packed_shingles = []
+    used_tokens = 0
+    dropped = {"low_score": 0, "duplicate": 0, "budget": 0}
+
+    for rank, (doc, score) in enumerate(scored_docs):
+        if rank > 0 and score < best_score * min_relative_score:
+            dropped["low_score"] += 1
+            continue
+        doc_shingles = shingles(doc.page_content)
+        if any(len(doc_shingles & other) / len(doc_shingles) >= duplicate_containment for other in packed_shingles):
+            dropped["duplicate"] += 1
+            continue
+        tokens = estimate_tokens(doc.page_content)
+        if used_tokens + tokens > token_budget and packed:
+            dropped["budget"] += 1
+            continue
+        packed.append(doc)
+        packed_shingles.append(doc_shingles)
+        used_tokens += tokens
+
+    retrieved_tokens = sum(estimate_tokens(doc.page_content) for doc, _ in scored_docs)
+    report = {
+        "token_budget": token_budget,
+        "chunks_retrieved": len(scored_docs),
+        "chunks_packed": len(packed),
+        "dropped": dropped,
+        "tokens_retrieved": retrieved_tokens,
+        "tokens_packed": used_tokens,
+        "tokens_saved": retrieved_tokens - used_tokens,
+    }
+    return packed, report
+
+
+def compress_chunks(
+    scored_docs: List[Tuple[Document, float]],
+    question: str,
+    max_sentences: int,
+):
+    """
+    Extractive compression: keep, in their original order, the max_sentences sentences
+    of each chunk that share the most terms with the question. Chunks without any
+    overlapping sentence are kept whole, since they were retrieved for their meaning.
+    Returns ((doc, score) pairs, report) with the character compression ratio.
+    """
+    question_terms = {term for term in tokenize(question) if term not in _STOPWORDS}
+    compressed = []
+    chars_in = 0
+    chars_out = 0
+    for doc, score in scored_docs:
+        text = doc.page_content
+        chars_in += len(text)
+        sentences = [sentence for sentence in _SENTENCE_SPLIT.split(text) if sentence.strip()]
+        overlaps = [len(question_terms & set(tokenize(sentence))) for sentence in sentences]
+        if len(sentences) > max_sentences and any(overlaps):
+            ranked = sorted(range(len(sentences)), key=lambda i: overlaps[i], reverse=True)
+            keep = sorted(i for i in ranked[:max_sentences] if overlaps[i])
+            text = " ".join(sentences[i].strip() for i in keep)
+            doc = Document(page_content=text, metadata={**doc.metadata, "compressed": True})
+        chars_out += len(text)
+        compressed.append((doc, score))
+
+    report = {
+        "chars_in": chars_in,
+        "chars_out": chars_out,
+        "ratio": chars_out / chars_in if chars_in else 1.0,
+    }
+    return compressed, report
@@ -0,0 +1,128 @@
+"""
+Concurrent, batched chunk embedding with adaptive (AIMD) concurrency under provider throttling
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Callable, List
+
+from services.metrics import metrics
+
+# Consecutive successful batches needed before the concurrency limit grows back by one
+_RECOVERY_BATCHES = 4
+
+
+def _is_throttled(error: Exception) -> bool:
+    """True for rate-limit / quota errors (HTTP 429, RESOURCE_EXHAUSTED), including wrapped ones."""
+    while error is not None:
+        text = f"{type(error).__name__} {error}"
+        if "429" in text or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower():
+            return True
+        error = error.__cause__
+    return False
+
+
+class AsyncBatchEmbedder:
+    """
+    Splits texts into provider-sized batches and embeds them concurrently with
+    aembed_documents. All requests run on one dedicated event loop thread, so the
+    async client and the adaptive limit are shared by every caller, sync or async.
+    When the provider throttles, the concurrency limit is halved and the batch is
+    retried with exponential backoff; it grows back after sustained success.
+    """
+
+    def __init__(
+        self,
+        embeddings_factory: Callable,
+        batch_size: int,
+        max_concurrency: int,
+        max_retries: int,
+        backoff_seconds: float,
+    ):
+        self.embeddings_factory = embeddings_factory
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._limit = self.max_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._embeddings = None
+        self._condition = None
+        self._loop = None
+        self._start_lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="embedding-loop", daemon=True).start()
+            return self._loop
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, blocking the calling thread until every batch is done."""
+        if not texts:
+            return []
+        return asyncio.run_coroutine_threadsafe(self._embed_all(texts), self._get_loop()).result()
+
+    async def _embed_all(self, texts: List[str]) -> List[List[float]]:
+        if self._embeddings is None:
+            # Created on the embedding loop so its async client is bound to it
+            self._embeddings = self.embeddings_factory()
+            self._condition = asyncio.Condition()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._in_flight < self._limit)
+                self._in_flight += 1
+            start = time.perf_counter()
+            try:
+                vectors = await self._embeddings.aembed_documents(batch)
+            except Exception as e:
+                if not _is_throttled(e) or attempt >= self.max_retries:
+                    raise
+                throttled = True
+            else:
+                throttled = False
+            finally:
+                async with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+            if not throttled:
+                metrics.observe("embedding.batch_ms", (time.perf_counter() - start) * 1000)
+                metrics.observe("embedding.batch_size", len(batch))
+                self._on_success()
+                return vectors
+
+            self._on_throttle()
+            delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+            attempt += 1
+            print(f"AsyncBatchEmbedder: Throttled, retrying batch in {delay:.1f}s (limit now {self._limit})")
+            await asyncio.sleep(delay)
+
+    def _on_throttle(self):
+        metrics.incr("embedding.throttled")
+        self._limit = max(1, self._limit // 2)
+        self._successes = 0
+
+    def _on_success(self):
+        metrics.incr("embedding.batches")
+        self._successes += 1
+        if self._limit < self.max_concurrency and self._successes >= _RECOVERY_BATCHES:
+            self._limit += 1
+            self._successes = 0
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "max_concurrency": self.max_concurrency,
+            "current_limit": self._limit,
+            "in_flight": self._in_flight,
+        }
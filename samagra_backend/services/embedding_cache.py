@@ -0,0 +1,110 @@
+"""
+Persistent, content-addressed cache of chunk embeddings backed by SQLite
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.metrics import metrics
+
+
+class EmbeddingCache:
+    """
+    Maps (embedding model, chunk text) to its vector so identical chunks are
+    never sent to the embedding API twice. Entries are evicted least recently
+    used first once max_entries is exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        print(f"EmbeddingCache: Opened {path} with {self._size} entries")
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Return cached vectors keyed by position in texts; missing texts are omitted."""
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = list(set(keys[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+        result = {
+            position: np.frombuffer(found[key], dtype=np.float32).tolist()
+            for position, key in enumerate(keys)
+            if key in found
+        }
+        hits = len(result)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        metrics.incr("embedding_cache.hits", hits)
+        metrics.incr("embedding_cache.misses", len(texts) - hits)
+        return result
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for texts, evicting the least recently used entries if over capacity."""
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._size += self._conn.total_changes - before
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+                metrics.incr("embedding_cache.evictions", overflow)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
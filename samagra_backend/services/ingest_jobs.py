@@ -0,0 +1,118 @@
+"""
+Background ingestion jobs: uploads are accepted immediately and processed by a bounded worker queue
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from core.config import settings
+from services.rag_service import aprocess_uploaded_document
+from services.store_registry import store_registry
+
+# Finished jobs kept around for status polling
+MAX_FINISHED_JOBS = 200
+
+
+class IngestJob:
+    """Progress of one background document ingestion"""
+
+    def __init__(self, filename: Optional[str], size: int, file_hash: str, session_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id  # Namespace the document is indexed into (None is the default)
+        self.filename = filename
+        self.size = size
+        self.file_hash = file_hash
+        self.status = "queued"  # queued -> parsing -> embedding -> completed | failed
+        self.pages_parsed = 0
+        self.total_pages = None
+        self.chunks_embedded = 0
+        self.total_chunks = None
+        self.vectors_indexed = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def update(self, **updates):
+        """Progress callback handed to the ingestion pipeline (called from a worker thread)"""
+        for name, value in updates.items():
+            setattr(self, name, value)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "filename": self.filename,
+            "size": self.size,
+            "status": self.status,
+            "pages_parsed": self.pages_parsed,
+            "total_pages": self.total_pages,
+            "chunks_embedded": self.chunks_embedded,
+            "total_chunks": self.total_chunks,
+            "vectors_indexed": self.vectors_indexed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestJobManager:
+    """Runs ingestion jobs in the background with at most max_concurrent jobs active at once"""
+
+    def __init__(self, max_concurrent: int):
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._jobs = OrderedDict()  # job id -> IngestJob
+        self._tasks = {}  # job id -> asyncio.Task (kept referenced until done)
+
+    def submit(
+        self, file_content: bytes, filename: Optional[str], file_hash: str, session_id: Optional[str] = None
+    ) -> IngestJob:
+        """Queue a document for ingestion; an identical upload to the same session already in progress is reused"""
+        for job in self._jobs.values():
+            if job.file_hash == file_hash and job.session_id == session_id and not job.finished:
+                print(f"IngestJobManager: Reusing in-progress job {job.id} for '{filename}'")
+                return job
+
+        job = IngestJob(filename, len(file_content), file_hash, session_id)
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job, file_content))
+        self._prune()
+        print(f"IngestJobManager: Queued job {job.id} for '{filename}'")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: IngestJob, file_content: bytes):
+        try:
+            async with self._semaphore:
+                # Leased when the job starts, since the namespace may have been evicted while queued
+                async with store_registry.lease(job.session_id) as store:
+                    success = await aprocess_uploaded_document(store, file_content, job.filename, job.file_hash, job.update)
+            if success:
+                job.status = "completed"
+            else:
+                job.status = "failed"
+                job.error = "Failed to process the document"
+        except Exception as e:
+            print(f"IngestJobManager: Job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._tasks.pop(job.id, None)
+            print(f"IngestJobManager: Job {job.id} {job.status}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+
+# Global ingestion job manager
+ingest_jobs = IngestJobManager(settings.INGEST_MAX_CONCURRENT_JOBS)
@@ -0,0 +1,115 @@
+"""
+In-process BM25 inverted index kept next to a store's FAISS index, for exact identifiers,
+part numbers and names that embedding search tends to miss
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import List, Tuple
+
+# BM25 term-frequency saturation and document-length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words, keeping joined identifiers such as "XJ-220" or "v2.1.3" together
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+# Identifiers are at least this long, and terms of digits alone (years, counts) need this many digits
+IDENTIFIER_MIN_LENGTH = 4
+IDENTIFIER_MIN_DIGITS = 6
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of text; joined identifiers are indexed whole and by their parts."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./]", token) if part)
+    return tokens
+
+
+def shingles(text: str, size: int = 3):
+    """Set of overlapping size-word sequences of text, for near-duplicate detection."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def is_identifier(term: str) -> bool:
+    """
+    Terms that look like codes rather than words or ordinary numbers: letters mixed with digits
+    ("xj220", "xj-220", "v2.1") or long digit strings such as part and order numbers.
+    """
+    digits = sum(ch.isdigit() for ch in term)
+    if len(term) < IDENTIFIER_MIN_LENGTH or not digits:
+        return False
+    return any(ch.isalpha() for ch in term) or digits >= IDENTIFIER_MIN_DIGITS
+
+
+class LexicalIndex:
+    """BM25 over chunks addressed by their position in the vector index"""
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {position: term frequency}
+        self._lengths = []  # token count per position
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, texts):
+        """Index texts at the next positions (call in the same order chunks enter the vector index)."""
+        for text in texts:
+            position = len(self._lengths)
+            counts = Counter(tokenize(text))
+            for term, count in counts.items():
+                self._postings[term][position] = count
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._total_length += length
+
+    def clear(self):
+        self._postings.clear()
+        self._lengths = []
+        self._total_length = 0
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (position, BM25 score) pairs, best first."""
+        count = len(self._lengths)
+        if not count:
+            return []
+        average_length = self._total_length / count
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(len(postings))
+            for position, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[position] / average_length)
+                scores[position] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def _idf(self, document_frequency: int) -> float:
+        count = len(self._lengths)
+        return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def is_decisive(self, query: str, results: List[Tuple[int, float]], ratio: float, min_idf: float) -> bool:
+        """
+        True when the query names identifiers, each of them rare in the corpus (IDF of at
+        least min_idf), the top chunk contains all of them, and it outscores the runner-up
+        by at least ratio - i.e. embedding search cannot do better.
+        """
+        if not results:
+            return False
+        identifiers = {term for term in tokenize(query) if is_identifier(term)}
+        if not identifiers:
+            return False
+        top_position, top_score = results[0]
+        for term in identifiers:
+            postings = self._postings.get(term, {})
+            if top_position not in postings or self._idf(len(postings)) < min_idf:
+                return False
+        return len(results) == 1 or top_score >= ratio * results[1][1]
@@ -0,0 +1,103 @@
+"""
+Lightweight in-process metrics (counters and latency observations) exposed via /metrics
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Number of recent per-turn timing records kept for /metrics
+RECENT_TURNS = 50
+
+
+class Metrics:
+    """Thread-safe registry of named counters and observed values"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._observations = {}
+        self._recent_turns = deque(maxlen=RECENT_TURNS)
+
+    def incr(self, name: str, value: int = 1):
+        """Increase a counter by value"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Record one observation (e.g. a latency in ms) for a named series"""
+        with self._lock:
+            series = self._observations.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            series["count"] += 1
+            series["total"] += value
+            series["max"] = max(series["max"], value)
+
+    def mean(self, name: str):
+        """Average of a series, or None before its first observation"""
+        with self._lock:
+            series = self._observations.get(name)
+            return series["total"] / series["count"] if series else None
+
+    def record_turn(self, record: dict):
+        """Keep a per-turn timing record and fold its stage latencies into the observations"""
+        for stage, timing in record["stages"].items():
+            self.observe(f"turn.{stage}_ms", timing["ms"])
+        self.observe("turn.total_ms", record["total_ms"])
+        with self._lock:
+            self._recent_turns.append(record)
+
+    def snapshot(self) -> dict:
+        """Return a copy of all counters and observation summaries"""
+        with self._lock:
+            observations = {
+                name: {
+                    "count": series["count"],
+                    "avg": series["total"] / series["count"] if series["count"] else 0.0,
+                    "max": series["max"],
+                }
+                for name, series in self._observations.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "observations": observations,
+                "recent_turns": list(self._recent_turns),
+            }
+
+
+class TurnTimer:
+    """Times the stages of a single chat turn (retrieval, generation, ...) and records the result"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.mode = None  # "rag", "general" or "image", set once the turn is routed
+        self.stages = {}
+        self.details = {}  # Free-form per-turn values (e.g. retrieval scores)
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block; repeated stages accumulate time and a call count"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timing = self.stages.setdefault(name, {"calls": 0, "ms": 0.0})
+            timing["calls"] += 1
+            timing["ms"] += (time.perf_counter() - start) * 1000
+
+    def finish(self):
+        record = {
+            "endpoint": self.endpoint,
+            "mode": self.mode,
+            "stages": self.stages,
+            "details": self.details,
+            "total_ms": (time.perf_counter() - self._start) * 1000,
+        }
+        summary = ", ".join(f"{name}={t['ms']:.0f}ms x{t['calls']}" for name, t in self.stages.items())
+        print(f"Turn timings ({self.endpoint}, mode={self.mode}): {summary}; total={record['total_ms']:.0f}ms")
+        metrics.record_turn(record)
+        return record
+
+
+# Global metrics registry
+metrics = Metrics()
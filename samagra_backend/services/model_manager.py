@@ -1,6 +1,8 @@
 """
 Model Manager for handling AI model selection and initialization
 """
+import threading
+from typing import Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from core.config import settings
 
@@ -24,7 +26,7 @@ MODALITY_TEXT = 1
 MODALITY_IMAGE = 2
 
 class ModelManager:
-    """Manages AI model instances and switching"""
+    """Manages one reusable client per available model and the default model choice"""
     
     # Available models mapping
     AVAILABLE_MODELS = {
@@ -33,26 +35,31 @@ class ModelManager:
             'name': 'Gemini 2.5 Flash-Lite',
             'description': 'Fastest and most cost-effective model',
             'mode': 'text',
+            'context_token_budget': 2000,
         },
         'gemini-2.5-flash': {
             'name': 'Gemini 2.5 Flash',
             'description': 'Fast and efficient for most conversations',
             'mode': 'text',
+            'context_token_budget': 3000,
         },
         'gemini-2.5-pro': {
             'name': 'Gemini 2.5 Pro',
             'description': 'Most capable model for complex tasks',
             'mode': 'text',
+            'context_token_budget': 6000,
         },
         'gemini-2.0-flash-lite': {
             'name': 'Gemini 2.0 Flash-Lite',
             'description': 'Lightweight and quick responses',
             'mode': 'text',
+            'context_token_budget': 2000,
         },
         'gemini-2.0-flash': {
             'name': 'Gemini 2.0 Flash',
             'description': 'Balanced performance and speed',
             'mode': 'text',
+            'context_token_budget': 3000,
         },
         # Image generation model
         'gemini-2.0-flash-preview-image-generation': {
@@ -62,25 +69,24 @@ class ModelManager:
         },
     }
     
+    DEFAULT_MODEL_ID = 'gemini-2.5-flash-lite'
+    
     def __init__(self):
-        self._current_model_id = 'gemini-2.5-flash-lite'  # Default model
-        self._llm = None
-        self._initialize_model()
+        self._current_model_id = self.DEFAULT_MODEL_ID  # Default for requests that name no model
+        self._clients = {}  # model id -> ChatGoogleGenerativeAI, built on first use and reused
+        self._lock = threading.Lock()
+        self.get_llm()
     
-    def _initialize_model(self):
-        """Initialize the language model with current settings"""
-        if self._current_model_id not in self.AVAILABLE_MODELS:
-            print(f"Warning: Unknown model ID '{self._current_model_id}'. Using default.")
-            self._current_model_id = 'gemini-2.5-flash-lite'
-        
-        model_info = self.AVAILABLE_MODELS[self._current_model_id]
+    def _create_client(self, model_id: str):
+        """Initialize the language model client for model_id"""
+        model_info = self.AVAILABLE_MODELS[model_id]
         is_image_model = model_info.get('mode') == 'image'
         
-        print(f"Initializing model: {self._current_model_id} (mode: {model_info.get('mode', 'text')})")
+        print(f"Initializing model: {model_id} (mode: {model_info.get('mode', 'text')})")
         
         # Configure model based on type
         config = {
-            'model': self._current_model_id,
+            'model': model_id,
             'google_api_key': settings.GOOGLE_API_KEY,
             'convert_system_message_to_human': True,
             'streaming': True,
@@ -92,21 +98,41 @@ class ModelManager:
         if is_image_model:
             config['response_modalities'] = [MODALITY_IMAGE, MODALITY_TEXT]
         
-        self._llm = ChatGoogleGenerativeAI(**config)
+        return ChatGoogleGenerativeAI(**config)
+    
+    def resolve_model_id(self, model_id: Optional[str] = None) -> str:
+        """
+        Model a request should use: model_id when it is a known model, otherwise the
+        current default (set via set_model).
+        """
+        if model_id and model_id in self.AVAILABLE_MODELS:
+            return model_id
+        if model_id:
+            print(f"Warning: Unknown model ID '{model_id}'. Using default.")
+        return self._current_model_id
     
-    def get_llm(self):
-        """Get the current language model instance"""
-        return self._llm
+    def get_llm(self, model_id: Optional[str] = None):
+        """
+        Get the client of model_id (the default model if omitted). Clients are built once
+        per model and shared by all requests, so choosing a model never rebuilds one.
+        """
+        model_id = self.resolve_model_id(model_id)
+        client = self._clients.get(model_id)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(model_id)
+                if client is None:
+                    client = self._clients[model_id] = self._create_client(model_id)
+        return client
     
-    def is_image_generation_model(self) -> bool:
-        """Check if current model is an image generation model"""
-        if self._current_model_id not in self.AVAILABLE_MODELS:
-            return False
-        return self.AVAILABLE_MODELS[self._current_model_id].get('mode') == 'image'
+    def is_image_generation_model(self, model_id: Optional[str] = None) -> bool:
+        """Check if a model (the default model if omitted) is an image generation model"""
+        model_id = self.resolve_model_id(model_id)
+        return self.AVAILABLE_MODELS[model_id].get('mode') == 'image'
     
     def set_model(self, model_id: str):
         """
-        Change the current model
+        Change the default model used by requests that do not name one
         
         Args:
             model_id: The model identifier (e.g., 'gemini-2.5-flash')
@@ -119,15 +145,19 @@ class ModelManager:
             return False
         
         if model_id != self._current_model_id:
-            print(f"Switching model from {self._current_model_id} to {model_id}")
+            print(f"Switching default model from {self._current_model_id} to {model_id}")
             self._current_model_id = model_id
-            self._initialize_model()
-            return True
-        
+        # Warm the client so the next request does not pay for it
+        self.get_llm(model_id)
         return True
     
+    def get_context_token_budget(self, model_id: Optional[str] = None) -> int:
+        """Prompt tokens a model (the default model if omitted) may spend on retrieved document context"""
+        model_info = self.AVAILABLE_MODELS[self.resolve_model_id(model_id)]
+        return model_info.get('context_token_budget', settings.CONTEXT_TOKEN_BUDGET)
+    
     def get_current_model_id(self) -> str:
-        """Get the current model ID"""
+        """Get the default model ID"""
         return self._current_model_id
     
     def get_available_models(self) -> dict:
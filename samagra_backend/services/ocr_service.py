@@ -0,0 +1,95 @@
+"""
+Process pool for EasyOCR: each worker process loads one reader and reuses it
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import List
+
+from core.config import settings
+
+# EasyOCR fallback imports
+try:
+    import easyocr
+    from PIL import Image
+    import numpy as np
+    _EASYOCR_AVAILABLE = True
+except ImportError:
+    _EASYOCR_AVAILABLE = False
+
+# Languages loaded into every reader
+OCR_LANGUAGES = ['en']
+
+# Reader owned by the current worker process (never set in the API process)
+_reader = None
+
+
+def _init_worker():
+    """Load the detection and recognition models once, when a worker process starts."""
+    global _reader
+    if _reader is None:
+        _reader = easyocr.Reader(OCR_LANGUAGES)
+        print("EasyOCRPool: Reader loaded in worker process")
+
+
+def _warm_up_worker():
+    return True
+
+
+def _read_text(image_content: bytes) -> List[str]:
+    """Run EasyOCR on raw image bytes inside a worker and return the non-empty text lines."""
+    _init_worker()
+    image = Image.open(io.BytesIO(image_content))
+    image_np = np.array(image)
+    results = _reader.readtext(image_np)
+    return [result[1] for result in results if result[1].strip()]
+
+
+class EasyOCRPool:
+    """
+    Lazily started pool of worker processes, each holding a warm EasyOCR reader.
+    Recognition runs outside the API process, so it never holds its GIL.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return _EASYOCR_AVAILABLE
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                print(f"EasyOCRPool: Starting {self.max_workers} worker process(es)")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def read_text(self, image_content: bytes) -> List[str]:
+        """Extract text lines from an image, blocking until a worker has processed it."""
+        return self._get_executor().submit(_read_text, image_content).result()
+
+    def warm_up(self):
+        """Start every worker now so the first OCR request does not pay the model load."""
+        if not self.available:
+            return
+        executor = self._get_executor()
+        wait([executor.submit(_warm_up_worker) for _ in range(self.max_workers)])
+        print("EasyOCRPool: Workers warmed up")
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global EasyOCR pool
+ocr_pool = EasyOCRPool(settings.OCR_POOL_SIZE)
@@ -0,0 +1,101 @@
+"""
+In-memory PDF text extraction, parsing page ranges in parallel worker processes for large files
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Iterator, List, Tuple
+
+from langchain.schema import Document
+from pypdf import PdfReader
+
+from core.config import settings
+
+
+def _extract_page_range(shm_name: str, size: int, start: int, end: int) -> List[Tuple[int, str]]:
+    """Worker: parse the PDF held in shared memory and extract text for pages [start, end)."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        reader = PdfReader(io.BytesIO(bytes(shm.buf[:size])))
+        return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+    finally:
+        shm.close()
+
+
+class PDFParser:
+    """
+    Extracts one Document per page straight from the uploaded bytes (no temp file).
+    Documents with at least min_parallel_pages pages are split into page ranges
+    that worker processes parse concurrently; pages are yielded as ranges finish.
+    """
+
+    def __init__(self, max_workers: int, pages_per_task: int, min_parallel_pages: int):
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.min_parallel_pages = min_parallel_pages
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                print(f"PDFParser: Starting {self.max_workers} parser process(es)")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def parse(self, file_content: bytes, source: str) -> Tuple[int, Iterator[Document]]:
+        """Return the page count and an iterator of page Documents (not necessarily in page order)."""
+        reader = PdfReader(io.BytesIO(file_content))
+        total_pages = len(reader.pages)
+        if total_pages < self.min_parallel_pages or self.max_workers == 1:
+            return total_pages, self._iter_serial(reader, source, total_pages)
+        return total_pages, self._iter_parallel(file_content, source, total_pages)
+
+    @staticmethod
+    def _page_document(text: str, source: str, page: int, total_pages: int) -> Document:
+        return Document(page_content=text, metadata={"source": source, "page": page, "total_pages": total_pages})
+
+    def _iter_serial(self, reader: PdfReader, source: str, total_pages: int) -> Iterator[Document]:
+        for i, page in enumerate(reader.pages):
+            yield self._page_document(page.extract_text() or "", source, i, total_pages)
+
+    def _iter_parallel(self, file_content: bytes, source: str, total_pages: int) -> Iterator[Document]:
+        # Workers read the file from shared memory rather than receiving a copy per task
+        shm = shared_memory.SharedMemory(create=True, size=len(file_content))
+        try:
+            shm.buf[:len(file_content)] = file_content
+            executor = self._get_executor()
+            futures = [
+                executor.submit(_extract_page_range, shm.name, len(file_content), start, min(start + self.pages_per_task, total_pages))
+                for start in range(0, total_pages, self.pages_per_task)
+            ]
+            print(f"PDFParser: Parsing {total_pages} pages in {len(futures)} parallel ranges")
+            try:
+                for future in as_completed(futures):
+                    for i, text in future.result():
+                        yield self._page_document(text, source, i, total_pages)
+            finally:
+                for future in futures:
+                    future.cancel()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global PDF parser
+pdf_parser = PDFParser(
+    max_workers=settings.PDF_PARSE_WORKERS,
+    pages_per_task=settings.PDF_PAGES_PER_TASK,
+    min_parallel_pages=settings.PDF_PARALLEL_MIN_PAGES,
+)
@@ -1,70 +1,622 @@
+import asyncio
+import itertools
 import os
-import tempfile
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai  import GoogleGenerativeAIEmbeddings
 from core.config import settings
-from typing import Optional
+from services.cache import LRUCache, SingleFlight
+from services.embedding_cache import EmbeddingCache
+from services.embedding_batcher import AsyncBatchEmbedder
+from services.ocr_service import ocr_pool
+from services.pdf_parser import pdf_parser
+from services.metrics import metrics
+from services.lexical_index import LexicalIndex, shingles
+from services.vector_index import (
+    build_index,
+    can_reconstruct,
+    estimate_recall,
+    index_build_executor,
+    index_memory_bytes,
+    index_quantization,
+    index_type,
+    read_index,
+    reconstruct_vectors,
+    search_params,
+    set_search_params,
+    target_index_type,
+    target_quantization,
+    without_vectors,
+)
+from typing import Callable, Optional
 import base64
+import hashlib
 import json
 import requests
 from langchain.schema import Document
+from langchain_core.runnables import RunnableLambda
+
+# Number of chunks handed to the RAG prompt per question
+RETRIEVAL_K = 10
+
+# Chunks appended to the index per hold of the store lock, so a search waits for at most one slice of inserts
+INDEX_ADD_SLICE_SIZE = 64
+
+# Metadata flag on chunks returned by a decisive lexical match (see search_with_scores)
+LEXICAL_MATCH = "lexical_match"
+
+# Embedding model used for chunks and queries
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+# Native dimension of EMBEDDING_MODEL (the baseline for memory savings)
+EMBEDDING_FULL_DIMENSIONS = 3072
+
+# Files of the on-disk snapshot of a DocumentStore. The manifest names the index and chunk log
+# of the committed snapshot; new ones are written under the next generation's names
+_MANIFEST_FILE = "manifest.json"
+_SAMPLE_FILE = "sample.npy"
+_INDEX_FILE = "index-{generation}.faiss"
+_CHUNKS_FILE = "chunks-{generation}.jsonl"
+_SNAPSHOT_PREFIXES = ("index-", "chunks-")
+
+# Store versions are unique across all stores and reloads, so cached results never outlive a change
+_store_versions = itertools.count(1)
+
+
+class _GeminiEmbeddings(GoogleGenerativeAIEmbeddings):
+    """Gemini embeddings requested at a fixed output dimensionality (None keeps the model's native size)."""
+
+    output_dimensionality: Optional[int] = None
+
+    def embed_documents(self, texts, **kwargs):
+        kwargs.setdefault("output_dimensionality", self.output_dimensionality)
+        return super().embed_documents(texts, **kwargs)
+
+    async def aembed_documents(self, texts, **kwargs):
+        kwargs.setdefault("output_dimensionality", self.output_dimensionality)
+        return await super().aembed_documents(texts, **kwargs)
+
+    def embed_query(self, text, **kwargs):
+        kwargs.setdefault("output_dimensionality", self.output_dimensionality)
+        return super().embed_query(text, **kwargs)
+
+    async def aembed_query(self, text, **kwargs):
+        kwargs.setdefault("output_dimensionality", self.output_dimensionality)
+        return await super().aembed_query(text, **kwargs)
+
+
+class StoreCapacityError(Exception):
+    """Raised when indexing would take a DocumentStore past its vector or memory budget."""
+
+
+class StoreClosedError(Exception):
+    """Raised on writes to a DocumentStore that was unloaded; get the namespace from the StoreRegistry again."""
 
-# EasyOCR fallback imports
-try:
-    import easyocr
-    from PIL import Image
-    import io
-    import numpy as np
-    _EASYOCR_AVAILABLE = True
-except ImportError:
-    _EASYOCR_AVAILABLE = False
 
 # This will hold our document's knowledge in memory.
 # Using a simple class to manage state more robustly with cumulative storage
 class DocumentStore:
-    def __init__(self):
+    def __init__(
+        self,
+        persist_dir: Optional[str] = None,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        embedder: Optional[AsyncBatchEmbedder] = None,
+        namespace: str = "default",
+        max_vectors: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
         self.vector_db = None  # FAISS vector database
         self.retriever = None
         self.uploaded_files = []  # Track uploaded files
         self.embeddings = None  # Store embeddings instance for reuse
+        self.persist_dir = persist_dir  # Snapshot directory (None disables persistence)
+        self._persisted_count = 0  # Leading chunks whose records are in the snapshot's chunk log
+        self._manifest = None  # Manifest of the committed snapshot (None if there is none)
+        self._generation = 0  # Generation of the newest snapshot on disk; files are named after it
+        self._saved_version = None  # Store version whose index the committed snapshot holds
+        self.embedding_cache = embedding_cache  # Shared chunk-embedding cache (None disables caching)
+        self.embedder = embedder  # Concurrent batch embedder for chunks (None embeds synchronously)
+        self._lock = threading.RLock()  # Held briefly by searches and by each change to the index
+        self._write_lock = threading.RLock()  # Serialises changes; long read-only work holds it without _lock
+        self._save_lock = threading.RLock()  # Serialises snapshot writes (taken before _write_lock, then _lock)
+        self._save_pending = False  # A background save is queued on the snapshot executor
+        self._ingesting = set()  # Content hashes of uploads currently being ingested
+        self.namespace = namespace  # Session/tenant this store belongs to
+        self.max_vectors = max_vectors  # Vector budget (None is unlimited)
+        self.max_bytes = max_bytes  # Estimated memory budget (None is unlimited)
+        self._text_bytes = 0  # Size of the chunk texts held in the docstore
+        self.last_used = time.monotonic()  # For idle/LRU eviction by the StoreRegistry
+        self._leases = 0  # Requests currently using the store (counted by the StoreRegistry)
+        self.closed = False  # Set once unloaded; the registry hands out a fresh store afterwards
+        self._rebuilding = False  # A replacement index is being built in the background
+        self._sample = None  # Reservoir sample of original (float32, normalised) vectors for recall estimates
+        self._sample_seen = 0  # Vectors offered to the reservoir so far
+        self._sample_dirty = False  # Sample changed since the last snapshot
+        self._random = random.Random(0)
+        self.lexical_index = LexicalIndex()  # BM25 over the same chunks, by vector index position
+        self.version = next(_store_versions)  # Changes whenever search results could change
     
     def initialize_embeddings(self):
         """Initialize embeddings if not already done"""
         if self.embeddings is None:
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/gemini-embedding-001",
-                google_api_key=settings.GOOGLE_API_KEY
-            )
+            self.embeddings = _create_embeddings()
             print("DocumentStore: Initialized embeddings")
         return self.embeddings
     
     def add_documents(self, docs, file_info):
-        """Add new documents to existing vector store or create new one"""
+        """
+        Embed the new chunks and append them straight into the live index.
+        The vector store and its retriever are created once, on first use.
+        """
+        if not docs:
+            print("DocumentStore: No chunks to add")
+            return False
+
+        # Embedding is network-bound, so it happens before taking the lock
+        vectors = self.embed_documents(docs)
+        with self._write_lock:
+            self.index_documents(docs, vectors)
+            self.register_file(file_info)
+        return True
+
+    def embed_documents(self, docs):
+        """Embed chunks for indexing (see index_documents)."""
+        return self._embed_texts([doc.page_content for doc in docs])
+
+    def index_documents(self, docs, vectors):
+        """
+        Append already embedded chunks to the live index; they are searchable immediately.
+        They are added INDEX_ADD_SLICE_SIZE at a time, releasing the lock in between so
+        searches are not held up by a large batch of (HNSW) inserts.
+        Returns their docstore ids (see remove_documents).
+        """
+        with self._write_lock:
+            self._check_open()
+            self._check_capacity(docs, vectors)
+            if self.vector_db is None:
+                # Create new vector store sized to the embedding dimension
+                print("DocumentStore: Creating new vector store")
+                kind = target_index_type(0)
+                index = build_index(kind, len(vectors[0]), quantization=target_quantization(0, kind))
+                with self._lock:
+                    self.vector_db = self._create_vector_db(index)
+                    self.retriever = self._create_retriever()
+            else:
+                print("DocumentStore: Appending documents to existing vector store")
+            ids = []
+            for start in range(0, len(docs), INDEX_ADD_SLICE_SIZE):
+                texts = [doc.page_content for doc in docs[start:start + INDEX_ADD_SLICE_SIZE]]
+                metadatas = [doc.metadata for doc in docs[start:start + INDEX_ADD_SLICE_SIZE]]
+                with self._lock:
+                    ids += self.vector_db.add_embeddings(
+                        zip(texts, vectors[start:start + INDEX_ADD_SLICE_SIZE]), metadatas=metadatas
+                    )
+                    self._text_bytes += sum(len(text) for text in texts)
+                    self.lexical_index.add(texts)
+                    self._bump_version()
+            with self._lock:
+                self._update_sample(vectors)
+            self._maybe_rebuild_index()
+            return ids
+
+    def remove_documents(self, doc_ids):
+        """
+        Remove chunks from the index, docstore and BM25 index (used to roll back an upload
+        that failed part way). Later chunks move down to fill the gap, and the snapshot's
+        chunk log is rewritten from the first removed position on the next save.
+        """
+        doc_ids = set(doc_ids)
+        with self._save_lock, self._write_lock:
+            if self.vector_db is None or not doc_ids:
+                return
+            index_to_id = self.vector_db.index_to_docstore_id
+            positions = [position for position, doc_id in index_to_id.items() if doc_id in doc_ids]
+            if not positions:
+                return
+            kept_ids = [doc_id for _, doc_id in sorted(index_to_id.items()) if doc_id not in doc_ids]
+            removed_ids = [index_to_id[position] for position in positions]
+            # The replacement index and BM25 index are built while searches use the current ones
+            index = without_vectors(self.vector_db.index, positions)
+            lexical_index = LexicalIndex()
+            lexical_index.add(self.vector_db.docstore.search(doc_id).page_content for doc_id in kept_ids)
+            removed_bytes = sum(len(self.vector_db.docstore.search(doc_id).page_content) for doc_id in removed_ids)
+            with self._lock:
+                self.vector_db.index = index
+                self.vector_db.index_to_docstore_id = dict(enumerate(kept_ids))
+                self.vector_db.docstore.delete(removed_ids)
+                self.lexical_index = lexical_index
+                self._text_bytes -= removed_bytes
+                self._bump_version()
+            self._persisted_count = min(self._persisted_count, min(positions))
+        print(f"DocumentStore: Removed {len(positions)} chunks from namespace '{self.namespace}'")
+        self.schedule_save()
+
+    def _bump_version(self):
+        self.version = next(_store_versions)
+
+    def _update_sample(self, vectors):
+        """Reservoir-sample the original vectors, so quantization recall can be measured later."""
+        size = settings.VECTOR_RECALL_SAMPLE_SIZE
+        if size <= 0:
+            return
+        vectors = np.array(vectors, dtype="float32")
+        faiss.normalize_L2(vectors)
+        if self._sample is None:
+            self._sample = np.zeros((0, vectors.shape[1]), dtype="float32")
+        for vector in vectors:
+            self._sample_seen += 1
+            if len(self._sample) < size:
+                self._sample = np.vstack([self._sample, vector])
+            else:
+                slot = self._random.randrange(self._sample_seen)
+                if slot < size:
+                    self._sample[slot] = vector
+        self._sample_dirty = True
+
+    def _maybe_rebuild_index(self):
+        """Start a background rebuild when the store has grown into a different index type."""
+        with self._lock:
+            if self.vector_db is None or self._rebuilding:
+                return
+            index = self.vector_db.index
+            target = target_index_type(index.ntotal)
+            quantization = target_quantization(index.ntotal, target)
+            # IVF-PQ keeps only compressed codes, so it cannot be rebuilt into another type
+            if (target, quantization) == (index_type(index), index_quantization(index)) or not can_reconstruct(index):
+                return
+            self._rebuilding = True
+        print(f"DocumentStore: Rebuilding '{self.namespace}' index as {target}/{quantization} ({index.ntotal} vectors)")
+        index_build_executor.submit(self._rebuild_index, target, quantization)
+
+    def _rebuild_index(self, target: str, quantization: str):
+        """
+        Build and train a replacement index without holding the locks, so search and ingestion
+        continue on the old one, then catch up on vectors added meanwhile and swap it in.
+        Searches are only held up for the swap itself.
+        """
+        try:
+            with self._write_lock:
+                vector_db = self.vector_db
+                if vector_db is None:
+                    return
+                old_index = vector_db.index
+                count = old_index.ntotal
+                vectors = reconstruct_vectors(old_index, 0, count)
+
+            started = time.perf_counter()
+            new_index = build_index(target, old_index.d, vectors, quantization)
+            new_index.add(vectors)
+
+            with self._write_lock:
+                if self.vector_db is not vector_db or vector_db.index is not old_index:
+                    print(f"DocumentStore: '{self.namespace}' changed during index rebuild; discarding it")
+                    return
+                new_index.add(reconstruct_vectors(old_index, count))
+                with self._lock:
+                    vector_db.index = new_index
+                    self._bump_version()
+            self.schedule_save()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.observe("vector_index.rebuild_ms", elapsed_ms)
+            print(f"DocumentStore: '{self.namespace}' now uses a {target}/{quantization} index ({new_index.ntotal} vectors, built in {elapsed_ms:.0f}ms)")
+        except Exception as e:
+            print(f"DocumentStore: Index rebuild failed: {e}")
+        finally:
+            self._rebuilding = False
+
+    def _check_open(self):
+        if self.closed:
+            raise StoreClosedError(f"Namespace '{self.namespace}' was unloaded")
+
+    def _check_capacity(self, docs, vectors):
+        new_vectors = self.vector_count() + len(docs)
+        if self.max_vectors is not None and new_vectors > self.max_vectors:
+            raise StoreCapacityError(
+                f"Namespace '{self.namespace}' is full ({self.vector_count()} of {self.max_vectors} chunks indexed)"
+            )
+        if self.max_bytes is not None:
+            added = len(vectors) * len(vectors[0]) * 4 + sum(len(doc.page_content) for doc in docs)
+            if self.memory_bytes() + added > self.max_bytes:
+                raise StoreCapacityError(
+                    f"Namespace '{self.namespace}' is over its memory budget of {self.max_bytes // (1024 * 1024)} MB"
+                )
+
+    def vector_count(self) -> int:
+        return self.vector_db.index.ntotal if self.vector_db is not None else 0
+
+    def memory_bytes(self) -> int:
+        """Estimated memory held by the index and chunk texts."""
+        if self.vector_db is None:
+            return 0
+        return index_memory_bytes(self.vector_db.index) + self._text_bytes
+
+    def index_info(self) -> dict:
+        """Index type and current search parameters."""
+        if self.vector_db is None:
+            return {"type": None}
+        index = self.vector_db.index
+        return {
+            "type": index_type(index),
+            "quantization": index_quantization(index),
+            "dimensions": index.d,
+            "rebuilding": self._rebuilding,
+            **search_params(index),
+        }
+
+    def memory_report(self) -> dict:
+        """
+        Memory held by the index compared with full-dimension float32 storage, and the
+        estimated recall@10 of the current index against exact float32 search.
+        """
+        with self._lock:
+            if self.vector_db is None:
+                return {"vectors": 0}
+            index = self.vector_db.index
+            vectors = index.ntotal
+            index_bytes = index_memory_bytes(index)
+            sample = None if self._sample is None else self._sample.copy()
+            info = self.index_info()
+        baseline_bytes = vectors * EMBEDDING_FULL_DIMENSIONS * 4
+        return {
+            "vectors": vectors,
+            "index": info,
+            "index_bytes": index_bytes,
+            "bytes_per_vector": index_bytes / vectors if vectors else 0,
+            "full_dimension_float32_bytes": baseline_bytes,
+            "saved_bytes": baseline_bytes - index_bytes,
+            "chunk_text_bytes": self._text_bytes,
+            "recall_at_10": estimate_recall(sample, index) if sample is not None else None,
+            "recall_sample_size": 0 if sample is None else len(sample),
+        }
+
+    @property
+    def busy(self) -> bool:
+        """True while the store is leased by a request or an upload is being ingested into it."""
+        return self._leases > 0 or bool(self._ingesting)
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def register_file(self, file_info):
+        """Record a fully indexed upload and snapshot the store in the background."""
+        with self._write_lock, self._lock:
+            self._check_open()
+            # Track uploaded file
+            self.uploaded_files.append(file_info)
+            
+            print(f"DocumentStore: Now contains {len(self.uploaded_files)} files")
+            print(f"DocumentStore: Files: {[f.get('filename', f.get('source', 'unknown')) for f in self.uploaded_files]}")
+            
+        self.schedule_save()
+
+    def _embed_texts(self, texts):
+        """Embed chunk texts for indexing, reusing cached vectors for chunks seen before."""
         embeddings = self.initialize_embeddings()
-        
+        embed = self.embedder.embed if self.embedder else embeddings.embed_documents
+        if self.embedding_cache is None:
+            return embed(texts)
+
+        model_key = _embedding_cache_key(embeddings)
+        vectors = self.embedding_cache.get_many(model_key, texts)
+        missing_texts = list(dict.fromkeys(text for i, text in enumerate(texts) if i not in vectors))
+        if missing_texts:
+            new_vectors = embed(missing_texts)
+            self.embedding_cache.put_many(model_key, missing_texts, new_vectors)
+            by_text = dict(zip(missing_texts, new_vectors))
+            for i, text in enumerate(texts):
+                if i not in vectors:
+                    vectors[i] = by_text[text]
+        print(f"DocumentStore: Embedded {len(missing_texts)} chunks, {len(texts) - len(missing_texts)} served from cache")
+        return [vectors[i] for i in range(len(texts))]
+
+    def _create_vector_db(self, index, docs=None, index_to_id=None):
+        """Wrap a raw FAISS index (and optional existing docstore contents) in a LangChain vector store."""
+        return FAISS(
+            embedding_function=self.initialize_embeddings(),
+            index=index,
+            docstore=InMemoryDocstore(docs or {}),
+            index_to_docstore_id=index_to_id or {},
+            normalize_L2=True,
+        )
+
+    def _create_retriever(self):
+        """Expose search() as a runnable so it can be invoked or composed into chains like a retriever."""
+        return RunnableLambda(self.search, name="DocumentStoreRetriever")
+
+    def search(self, query: str, k: int = RETRIEVAL_K):
+        """Return the k most relevant chunks (see search_with_scores)."""
+        return [doc for doc, _ in self.search_with_scores(query, k)]
+
+    def search_with_scores(
+        self, query: str, k: int = RETRIEVAL_K, ef_search: Optional[int] = None, nprobe: Optional[int] = None
+    ):
+        """
+        Return up to k (chunk, cosine similarity) pairs, best first, collapsing
+        near-duplicates (e.g. the same passage indexed from two different files)
+        so they do not crowd the results. ef_search (HNSW) and nprobe (IVF-PQ)
+        override the configured recall/latency trade-off for this search.
+
+        BM25 matches are fused with the vector results by reciprocal rank. When
+        the lexical match is decisive (see LexicalIndex.is_decisive) its chunks
+        are returned without embedding the query, flagged with LEXICAL_MATCH in
+        their metadata and scored relative to the top hit rather than by cosine.
+
+        Results are cached until the store changes, query embeddings are cached
+        across stores, and concurrent identical searches share a single call.
+        """
         if self.vector_db is None:
-            # Create new vector store
-            print("DocumentStore: Creating new vector store")
-            self.vector_db = FAISS.from_documents(docs, embeddings)
-        else:
-            # Add to existing vector store
-            print("DocumentStore: Adding documents to existing vector store")
-            new_db = FAISS.from_documents(docs, embeddings)
-            self.vector_db.merge_from(new_db)
-        
-        # Update retriever
-        self.retriever = self.vector_db.as_retriever(search_kwargs={"k": 10})  # Increased k for multiple documents
-        
-        # Track uploaded file
-        self.uploaded_files.append(file_info)
-        
-        print(f"DocumentStore: Now contains {len(self.uploaded_files)} files")
-        print(f"DocumentStore: Files: {[f.get('filename', f.get('source', 'unknown')) for f in self.uploaded_files]}")
-        
-        return True
-    
+            return []
+        key = self._search_key(query, k, ef_search, nprobe)
+        cached = search_cache.get(key)
+        if cached is None:
+            cached = search_flight.run(key, lambda: self._search_uncached(key, query, k, ef_search, nprobe))
+        return list(cached)
+
+    async def asearch_with_scores(
+        self, query: str, k: int = RETRIEVAL_K, ef_search: Optional[int] = None, nprobe: Optional[int] = None
+    ):
+        """Async search_with_scores: the query is embedded without blocking the event loop."""
+        if self.vector_db is None:
+            return []
+        key = self._search_key(query, k, ef_search, nprobe)
+        cached = search_cache.get(key)
+        if cached is None:
+            cached = await search_flight.arun(key, lambda: self._asearch_uncached(key, query, k, ef_search, nprobe))
+        return list(cached)
+
+    def _search_key(self, query: str, k: int, ef_search: Optional[int], nprobe: Optional[int]):
+        return (self.version, query, k, ef_search, nprobe)
+
+    def _search_uncached(self, key, query: str, k: int, ef_search: Optional[int], nprobe: Optional[int]):
+        lexical_hits, results = self._lexical_search(query, k)
+        if results is None:
+            results = self._search_by_vector(self.embed_query(query), k, ef_search, nprobe, lexical_hits)
+        search_cache.set(key, results)
+        return results
+
+    async def _asearch_uncached(self, key, query: str, k: int, ef_search: Optional[int], nprobe: Optional[int]):
+        # Scoring and FAISS lookups wait for the store lock, so they run on the search pool
+        lexical_hits, results = await run_in_search_executor(self._lexical_search, query, k)
+        if results is None:
+            embedding = await self.aembed_query(query)
+            results = await run_in_search_executor(self._search_by_vector, embedding, k, ef_search, nprobe, lexical_hits)
+        search_cache.set(key, results)
+        return results
+
+    def embed_query(self, query: str):
+        """Embed a search query, reusing the vector of an identical recent (or in-flight) query."""
+        embeddings = self.initialize_embeddings()
+        key = (_embedding_cache_key(embeddings), query)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = query_embedding_flight.run(key, lambda: embeddings.embed_query(query))
+            query_embedding_cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, query: str):
+        embeddings = self.initialize_embeddings()
+        key = (_embedding_cache_key(embeddings), query)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = await query_embedding_flight.arun(key, lambda: embeddings.aembed_query(query))
+            query_embedding_cache.set(key, vector)
+        return vector
+
+    def has_decisive_lexical_match(self, query: str, k: int = RETRIEVAL_K) -> bool:
+        """True when search_with_scores answers query from BM25 alone, without embedding it."""
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return False
+        with self._lock:
+            if self.vector_db is None:
+                return False
+            hits = self.lexical_index.search(query, k * 2)
+            return self._is_decisive(query, hits)
+
+    def _lexical_search(self, query: str, k: int):
+        """BM25 candidates as (position, score) pairs, plus the final results when the match is decisive."""
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return [], None
+        with self._lock:
+            if self.vector_db is None:
+                return [], None
+            hits = self.lexical_index.search(query, k * 2)
+            if not self._is_decisive(query, hits):
+                return hits, None
+            top_score = hits[0][1]
+            results = [(_flag_lexical_match(self._doc_at(position)), score / top_score) for position, score in hits]
+        metrics.incr("retrieval.lexical_decisive")
+        print("DocumentStore: Decisive lexical match; skipping query embedding")
+        return hits, _collapse_near_duplicates(results)[:k]
+
+    def _is_decisive(self, query: str, hits) -> bool:
+        return self.lexical_index.is_decisive(
+            query, hits, settings.LEXICAL_DECISIVE_RATIO, settings.LEXICAL_DECISIVE_MIN_IDF
+        )
+
+    def _doc_at(self, position: int):
+        return self.vector_db.docstore.search(self.vector_db.index_to_docstore_id[position])
+
+    def _search_by_vector(
+        self,
+        embedding,
+        k: int,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        lexical_hits=(),
+    ):
+        with self._lock:
+            if self.vector_db is None:
+                return []
+            overridden = ef_search is not None or nprobe is not None
+            if overridden:
+                set_search_params(self.vector_db.index, ef_search, nprobe)
+            try:
+                candidates = self.vector_db.similarity_search_with_score_by_vector(embedding, k=k * 2)
+            finally:
+                if overridden:
+                    set_search_params(self.vector_db.index)
+            # Vectors are L2-normalised, so squared L2 distance d maps to cosine as 1 - d / 2
+            scored = [(doc, 1.0 - float(distance) / 2.0) for doc, distance in candidates]
+            if lexical_hits:
+                scored = self._fuse(scored, lexical_hits, embedding)
+        return _collapse_near_duplicates(scored)[:k]
+
+    def _fuse(self, scored, lexical_hits, embedding):
+        """
+        Reciprocal-rank fusion of vector and BM25 results. Each chunk keeps its cosine
+        similarity for routing; chunks found only lexically are scored against the query
+        from their stored vector (0 when the index cannot reconstruct it).
+        """
+        rrf_k = settings.RRF_K
+        fused = defaultdict(float)
+        docs = {}
+        cosines = {}
+        for rank, (doc, cosine) in enumerate(scored):
+            fused[doc.id] += 1.0 / (rrf_k + rank + 1)
+            docs[doc.id] = doc
+            cosines[doc.id] = cosine
+
+        query = np.array([embedding], dtype="float32")
+        faiss.normalize_L2(query)
+        for rank, (position, _) in enumerate(lexical_hits):
+            doc_id = self.vector_db.index_to_docstore_id[position]
+            fused[doc_id] += 1.0 / (rrf_k + rank + 1)
+            if doc_id not in docs:
+                docs[doc_id] = self.vector_db.docstore.search(doc_id)
+                try:
+                    cosines[doc_id] = float(self.vector_db.index.reconstruct(position) @ query[0])
+                except RuntimeError:
+                    cosines[doc_id] = 0.0
+        metrics.incr("retrieval.hybrid")
+        return [(docs[doc_id], cosines[doc_id]) for doc_id in sorted(fused, key=fused.get, reverse=True)]
+
+    def find_file_by_hash(self, file_hash: str):
+        """Return the file_info of an already indexed upload with this content hash, if any."""
+        for file_info in self.uploaded_files:
+            if file_info.get("content_hash") == file_hash:
+                return file_info
+        return None
+
+    def begin_ingest(self, file_hash: str) -> bool:
+        """Claim an upload for ingestion; False if it is already indexed or being ingested."""
+        with self._lock:
+            if file_hash in self._ingesting or self.find_file_by_hash(file_hash):
+                return False
+            self._ingesting.add(file_hash)
+            return True
+
+    def end_ingest(self, file_hash: str):
+        with self._lock:
+            self._ingesting.discard(file_hash)
+
     def get_retriever(self):
         print(f"DocumentStore: Getting retriever, active: {self.retriever is not None}")
         if self.retriever:
@@ -72,11 +624,41 @@ class DocumentStore:
         return self.retriever
     
     def clear(self):
-        self.vector_db = None
-        self.retriever = None
-        self.uploaded_files = []
-        # Keep embeddings instance for reuse
-        print("DocumentStore: Cleared all documents")
+        with self._save_lock, self._write_lock, self._lock:
+            self._check_open()
+            self.vector_db = None
+            self.retriever = None
+            self.uploaded_files = []
+            self._text_bytes = 0
+            self.lexical_index.clear()
+            self._sample = None
+            self._sample_seen = 0
+            self._bump_version()
+            # Keep embeddings instance for reuse
+            self._remove_snapshot()
+        print(f"DocumentStore: Cleared all documents in namespace '{self.namespace}'")
+
+    def unload(self):
+        """
+        Snapshot the store and release its index and chunks from memory.
+        Without persistence the contents are discarded. The store is closed
+        afterwards: later writes raise StoreClosedError instead of saving a
+        snapshot that no longer matches the one on disk.
+        """
+        with self._save_lock, self._write_lock:
+            self.closed = True
+            self.save()
+            with self._lock:
+                self.vector_db = None
+                self.retriever = None
+                self.uploaded_files = []
+                self._text_bytes = 0
+                self.lexical_index.clear()
+                self._sample = None
+                self._sample_seen = 0
+                self._bump_version()
+            self._persisted_count = 0
+        print(f"DocumentStore: Unloaded namespace '{self.namespace}'")
     
     def has_retriever(self):
         return self.retriever is not None
@@ -84,82 +666,459 @@ class DocumentStore:
     def get_file_list(self):
         return [f.get('filename', f.get('source', 'unknown')) for f in self.uploaded_files]
 
-# Global document store instance
-document_store = DocumentStore()
+    def save(self):
+        """
+        Snapshot the store to persist_dir.
+
+        Chunks are appended to a JSONL log so only the new ones are written on
+        each change, and the FAISS index is written only when it changed. Both
+        go to files the committed snapshot does not use (a new log when chunks
+        were removed, a new index file), and the manifest that names them is
+        replaced atomically last, so a crash mid-save leaves the previous
+        snapshot intact. The index is written while changes to the store wait,
+        but searches continue; the chunks are written outside the store locks.
+        """
+        if not self.persist_dir:
+            return False
+        with self._save_lock:
+            try:
+                with self._write_lock:
+                    if self.vector_db is None:
+                        return False
+                    snapshot = self._capture_snapshot()
+                return self._write_snapshot(snapshot)
+            except Exception as e:
+                print(f"DocumentStore: Failed to save snapshot: {e}")
+                self._sample_dirty = True
+                return False
+
+    def schedule_save(self):
+        """Save on the snapshot thread; requests made while a save is still queued share it."""
+        if not self.persist_dir:
+            return
+        with self._lock:
+            if self._save_pending:
+                return
+            self._save_pending = True
+        snapshot_executor.submit(self._background_save)
 
-def process_uploaded_document(file_content: bytes):
+    def _background_save(self):
+        with self._lock:
+            self._save_pending = False
+        self.save()
+
+    def _capture_snapshot(self) -> dict:
+        """
+        Collect the chunks and manifest save() writes, and write the index file if the index
+        changed since the last snapshot (caller holds the write lock, so nothing changes meanwhile).
+        """
+        generation = self._generation + 1
+        if self._manifest is not None and self._saved_version == self.version:
+            index_file = self._manifest["index_file"]
+        else:
+            index_file = _INDEX_FILE.format(generation=generation)
+            os.makedirs(self.persist_dir, exist_ok=True)
+            faiss.write_index(self.vector_db.index, os.path.join(self.persist_dir, index_file))
+        self._generation = generation
+
+        index_to_id = self.vector_db.index_to_docstore_id
+        total = len(index_to_id)
+        chunks = []
+        for position in range(self._persisted_count, total):
+            doc_id = index_to_id[position]
+            doc = self.vector_db.docstore.search(doc_id)
+            chunks.append({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata})
+        sample = self._sample.copy() if self._sample_dirty and self._sample is not None else None
+        self._sample_dirty = False
+        return {
+            "version": self.version,
+            "persisted_count": self._persisted_count,
+            "chunks": chunks,
+            "sample": sample,
+            "manifest": {
+                "generation": generation,
+                "index_file": index_file,
+                "chunk_count": total,
+                "sample_seen": self._sample_seen,
+                "uploaded_files": list(self.uploaded_files),
+            },
+        }
+
+    def _write_snapshot(self, snapshot: dict):
+        """Write the chunks of a captured snapshot and commit it (caller holds the save lock)."""
+        manifest = snapshot["manifest"]
+        persisted_count = snapshot["persisted_count"]
+        previous = self._manifest
+        if previous is not None and persisted_count == previous["chunk_count"]:
+            # Append to the committed log, dropping any tail left behind by an interrupted save
+            manifest["chunks_file"] = previous["chunks_file"]
+            chunks_path = os.path.join(self.persist_dir, manifest["chunks_file"])
+            _truncate_lines(chunks_path, persisted_count)
+        else:
+            # Chunks were removed (or nothing is committed yet): start a new log with the records still valid
+            manifest["chunks_file"] = _CHUNKS_FILE.format(generation=manifest["generation"])
+            chunks_path = os.path.join(self.persist_dir, manifest["chunks_file"])
+            previous_path = os.path.join(self.persist_dir, previous["chunks_file"]) if previous else None
+            _copy_lines(previous_path, chunks_path, persisted_count)
+
+        with open(chunks_path, "a", encoding="utf-8") as f:
+            for record in snapshot["chunks"]:
+                f.write(json.dumps(record) + "\n")
+        if snapshot["sample"] is not None:
+            _atomic_write(
+                os.path.join(self.persist_dir, _SAMPLE_FILE),
+                lambda path: _write_npy(path, snapshot["sample"]),
+            )
+        _atomic_write(
+            os.path.join(self.persist_dir, _MANIFEST_FILE),
+            lambda path: _write_json(path, manifest),
+        )
+        self._manifest = manifest
+        self._persisted_count = manifest["chunk_count"]
+        self._saved_version = snapshot["version"]
+        self._remove_unused_files()
+        print(f"DocumentStore: Saved snapshot ({len(snapshot['chunks'])} new chunks, {manifest['chunk_count']} total)")
+        return True
+
+    def load(self):
+        """
+        Restore the store from persist_dir if a snapshot exists.
+        Flat and HNSW indexes are memory-mapped rather than read into memory.
+        """
+        if not self.persist_dir:
+            return False
+
+        manifest_path = os.path.join(self.persist_dir, _MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            print("DocumentStore: No snapshot to restore")
+            return False
+
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            # Even if the snapshot is ignored, later saves must not reuse its file names before replacing it
+            self._generation = manifest["generation"]
+            chunk_count = manifest["chunk_count"]
+            chunks_path = os.path.join(self.persist_dir, manifest["chunks_file"])
+
+            index = read_index(os.path.join(self.persist_dir, manifest["index_file"]))
+            expected_dimensions = settings.EMBEDDING_DIMENSIONS or EMBEDDING_FULL_DIMENSIONS
+            if index.d != expected_dimensions:
+                print(f"DocumentStore: Snapshot has {index.d}-dimensional vectors but embeddings are {expected_dimensions}-dimensional; ignoring it")
+                return False
+            if index.ntotal != chunk_count:
+                print(f"DocumentStore: Snapshot index has {index.ntotal} vectors but manifest lists {chunk_count} chunks; ignoring it")
+                return False
+
+            docs = {}
+            index_to_id = {}
+            with open(chunks_path, encoding="utf-8") as f:
+                for position, line in enumerate(f):
+                    if position >= chunk_count:
+                        break
+                    record = json.loads(line)
+                    docs[record["id"]] = Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+                    index_to_id[position] = record["id"]
+            if len(index_to_id) != chunk_count:
+                print("DocumentStore: Snapshot chunk log is incomplete; ignoring it")
+                return False
+
+            self.vector_db = self._create_vector_db(index, docs, index_to_id)
+            # The lexical index is not persisted; rebuild it from the chunks in index order
+            self.lexical_index.clear()
+            self.lexical_index.add(docs[index_to_id[position]].page_content for position in range(chunk_count))
+            self.retriever = self._create_retriever()
+            self.uploaded_files = manifest.get("uploaded_files", [])
+            self._persisted_count = chunk_count
+            self._manifest = manifest
+            self._text_bytes = sum(len(doc.page_content) for doc in docs.values())
+            self._load_sample(manifest.get("sample_seen", chunk_count), index.d)
+            self._bump_version()
+            self._saved_version = self.version
+            self._remove_unused_files()
+            print(f"DocumentStore: Restored snapshot with {chunk_count} chunks from {len(self.uploaded_files)} files")
+            self._maybe_rebuild_index()
+            return True
+        except Exception as e:
+            print(f"DocumentStore: Failed to restore snapshot: {e}")
+            return False
+
+    def _load_sample(self, seen: int, dimensions: int):
+        path = os.path.join(self.persist_dir, _SAMPLE_FILE)
+        if not os.path.exists(path):
+            return
+        try:
+            sample = np.load(path)
+            if sample.ndim == 2 and sample.shape[1] == dimensions:
+                self._sample = sample
+                self._sample_seen = max(seen, len(sample))
+        except Exception as e:
+            print(f"DocumentStore: Could not read recall sample: {e}")
+
+    def _remove_snapshot(self):
+        self._persisted_count = 0
+        self._manifest = None
+        if not self.persist_dir:
+            return
+        # The manifest goes first, so an interrupted removal never leaves a partial snapshot behind
+        for name in (_MANIFEST_FILE, _SAMPLE_FILE):
+            _remove_file(os.path.join(self.persist_dir, name))
+        self._remove_unused_files()
+
+    def _remove_unused_files(self):
+        """Delete index and chunk files the committed snapshot does not name (older or interrupted saves)."""
+        if not os.path.isdir(self.persist_dir):
+            return
+        used = {self._manifest["index_file"], self._manifest["chunks_file"]} if self._manifest else set()
+        for name in os.listdir(self.persist_dir):
+            if name.startswith(_SNAPSHOT_PREFIXES) and name not in used:
+                _remove_file(os.path.join(self.persist_dir, name))
+
+
+def _create_embeddings():
+    return _GeminiEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=settings.GOOGLE_API_KEY,
+        output_dimensionality=settings.EMBEDDING_DIMENSIONS,
+    )
+
+
+def _embedding_cache_key(embeddings) -> str:
+    """Cache namespace of an embeddings client: vectors of different dimensionality never mix."""
+    dimensions = getattr(embeddings, "output_dimensionality", None)
+    return f"{embeddings.model}@{dimensions}" if dimensions else embeddings.model
+
+
+def _atomic_write(path: str, writer):
+    """Write a file through writer(tmp_path) and move it into place atomically."""
+    tmp_path = f"{path}.tmp"
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_npy(path: str, array):
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"DocumentStore: Error removing snapshot file {os.path.basename(path)}: {e}")
+
+
+def _copy_lines(source: Optional[str], path: str, line_count: int):
+    """Write the first line_count lines of source (None: none) to a new file at path."""
+    with open(path, "wb") as out:
+        if source is None or not line_count:
+            return
+        with open(source, "rb") as f:
+            for line in itertools.islice(f, line_count):
+                out.write(line)
+
+
+def _truncate_lines(path: str, line_count: int):
+    """Cut a file back to its first line_count lines (no-op if it is already that short)."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        for _ in range(line_count):
+            if not f.readline():
+                return
+        f.truncate()
+
+
+def content_hash(data: bytes) -> str:
+    """Hash of an upload's raw bytes, used to recognise files that are already indexed."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _flag_lexical_match(doc):
+    return Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, LEXICAL_MATCH: True})
+
+
+def _collapse_near_duplicates(scored_docs):
+    """Drop (doc, score) pairs whose word shingles overlap an earlier (higher ranked) one beyond NEAR_DUPLICATE_THRESHOLD."""
+    kept = []
+    kept_shingles = []
+    for doc, score in scored_docs:
+        doc_shingles = shingles(doc.page_content)
+        is_duplicate = any(
+            len(doc_shingles & other) / len(doc_shingles | other) >= settings.NEAR_DUPLICATE_THRESHOLD
+            for other in kept_shingles
+        )
+        if not is_duplicate:
+            kept.append((doc, score))
+            kept_shingles.append(doc_shingles)
+    if len(kept) < len(scored_docs):
+        print(f"DocumentStore: Collapsed {len(scored_docs) - len(kept)} near-duplicate chunks")
+    return kept
+
+
+# Global embedding cache shared by all stores
+embedding_cache = EmbeddingCache(
+    os.path.join(settings.DATA_DIR, "embedding_cache.sqlite3"),
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+) if settings.EMBEDDING_CACHE_ENABLED else None
+
+# Bounded pool for blocking ingestion work, so uploads never stall the event loop
+ingest_executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix="ingest")
+
+# Single thread that writes store snapshots in the background, one at a time
+snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+
+# Pool for searches (BM25 scoring and FAISS lookups), which may wait on a store lock held by ingestion
+search_executor = ThreadPoolExecutor(max_workers=settings.SEARCH_WORKERS, thread_name_prefix="search")
+
+
+async def run_in_ingest_executor(func, *args, **kwargs):
+    """Run a blocking ingestion step on the ingestion thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(ingest_executor, partial(func, *args, **kwargs))
+
+
+async def run_in_search_executor(func, *args, **kwargs):
+    """Run a search step on the search thread pool, so the event loop never waits on a store lock."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, partial(func, *args, **kwargs))
+
+
+# Global OCR result cache (image hash -> extracted text and engine); identical images in flight share one OCR call
+ocr_cache = LRUCache(
+    "ocr_cache",
+    max_entries=settings.OCR_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+)
+ocr_flight = SingleFlight("ocr")
+
+# Global caches of query embeddings (shared by all stores) and of search results (keyed by store version)
+query_embedding_cache = LRUCache("query_embedding_cache", max_entries=settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES)
+search_cache = LRUCache("search_cache", max_entries=settings.SEARCH_CACHE_MAX_ENTRIES)
+query_embedding_flight = SingleFlight("query_embedding")
+search_flight = SingleFlight("search")
+
+# Global concurrent chunk embedder shared by all stores
+embedding_batcher = AsyncBatchEmbedder(
+    _create_embeddings,
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    max_concurrency=settings.EMBEDDING_CONCURRENCY,
+    max_retries=settings.EMBEDDING_MAX_RETRIES,
+    backoff_seconds=settings.EMBEDDING_BACKOFF_SECONDS,
+)
+
+def process_uploaded_document(
+    store: DocumentStore,
+    file_content: bytes,
+    filename: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    progress: Optional[Callable[..., None]] = None,
+):
     """
-    Processes the content of an uploaded file and prepares it for Q&A.
+    Processes the content of an uploaded file and prepares it for Q&A in store.
+    Files whose bytes are already indexed are skipped (and reported as ready).
+    Pages are split as they are parsed and chunks are embedded and indexed in
+    batches, so the first ones can be retrieved while the rest are still being
+    ingested. progress, if given, is called with keyword updates
+    (status, pages_parsed, chunks_embedded, ...). Raises StoreCapacityError
+    if the document does not fit in the store's budget. If ingestion fails part
+    way, the chunks already indexed are removed again, so a retry starts clean.
     """
-    global document_store
-
     print(f"process_uploaded_document called with {len(file_content)} bytes")
+    report = progress or (lambda **updates: None)
 
-    # 1. Save the uploaded file content to a temporary file on the server.
-    #    LangChain's document loaders often work best with file paths.
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
-        print(f"Created temporary file: {temp_file_path}")
+    file_hash = file_hash or content_hash(file_content)
+    if not store.begin_ingest(file_hash):
+        print("Document already indexed or being ingested; skipping ingestion")
+        return True
 
+    indexed_ids = []  # Chunks of this upload in the index, until it is registered
+    registered = False
     try:
-        # 2. Load the document using the PyPDFLoader.
-        loader = PyPDFLoader(temp_file_path)
-        documents = loader.load()
-        print(f"Loaded {len(documents)} document pages")
+        # 1. Parse pages straight from memory (large PDFs in parallel worker processes)
+        #    and split each page into chunks as soon as it is available.
+        report(status="parsing")
+        total_pages, pages = pdf_parser.parse(file_content, filename or "document.pdf")
+        report(total_pages=total_pages)
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        batch_size = settings.INGEST_INDEX_BATCH_SIZE
+        pending = []
+        pages_parsed = 0
+        chunks_indexed = 0
 
-        if not documents:
-            print("No content found in document")
-            return False
+        def index_batch(batch):
+            # 2. Embed and index a batch into the cumulative vector store; it is searchable right away.
+            #    Later pages may still be parsing, but the job is embedding from the first batch on.
+            nonlocal chunks_indexed
+            report(status="embedding")
+            vectors = store.embed_documents(batch)
+            report(chunks_embedded=chunks_indexed + len(batch))
+            indexed_ids.extend(store.index_documents(batch, vectors))
+            chunks_indexed += len(batch)
+            report(vectors_indexed=chunks_indexed)
 
-        # 3. Split the document into smaller, manageable chunks.
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        docs = text_splitter.split_documents(documents)
-        print(f"Split document into {len(docs)} chunks")
+        for page in pages:
+            pages_parsed += 1
+            report(pages_parsed=pages_parsed)
+            pending.extend(text_splitter.split_documents([page]))
+            while len(pending) >= batch_size:
+                index_batch(pending[:batch_size])
+                pending = pending[batch_size:]
+        print(f"Loaded {pages_parsed} document pages")
 
-        if not docs:
+        if pending:
+            index_batch(pending)
+        report(total_chunks=chunks_indexed)
+        print(f"Split document into {chunks_indexed} chunks")
+
+        if not chunks_indexed:
             print("No chunks created from document")
             return False
 
-        # 4. Add documents to the cumulative vector store
+        # 3. Record the file once all of its chunks are indexed
         file_info = {
             "type": "document", 
-            "filename": temp_file_path.split("/")[-1], 
-            "chunks": len(docs), 
-            "pages": len(documents)
+            "filename": filename or "document.pdf", 
+            "chunks": chunks_indexed, 
+            "pages": total_pages,
+            "content_hash": file_hash,
         }
-        
-        success = document_store.add_documents(docs, file_info)
-        if success:
-            print("Document processed successfully and added to vector store.")
-        else:
-            print("Failed to add document to vector store.")
-            return False
+        store.register_file(file_info)
+        registered = True
+        print("Document processed successfully and added to vector store.")
         return True
 
+    except StoreCapacityError as e:
+        print(f"Document does not fit in the store: {e}")
+        raise
     except Exception as e:
         print(f"An error occurred during document processing: {e}")
         import traceback
         traceback.print_exc()
         return False
     finally:
-        # 6. Clean up and remove the temporary file.
         try:
-            os.remove(temp_file_path)
-            print(f"Cleaned up temporary file: {temp_file_path}")
-        except Exception as e:
-            print(f"Error cleaning up temp file: {e}")
+            if not registered and indexed_ids:
+                print(f"Rolling back {len(indexed_ids)} chunks of the unfinished upload")
+                store.remove_documents(indexed_ids)
+        finally:
+            store.end_ingest(file_hash)
 
 
-def process_uploaded_image(image_content: bytes, filename: Optional[str] = None) -> Optional[str]:
+def _extract_image_text(image_content: bytes, filename: Optional[str] = None):
     """
-    Extracts text from an uploaded image using Google Vision API (primary)
-    with EasyOCR as fallback. Indexes extracted text into FAISS vector store.
-    Returns extracted text on success, None on failure.
+    Extracts text from an image using Google Vision API (primary) with EasyOCR
+    as fallback. Returns (text, engine), with text None when nothing was found.
     """
-    global document_store
-
     extracted_text = None
+    engine = None
 
     # Try Google Vision API first
     api_key = getattr(settings, 'GOOGLE_API_KEY', None)
@@ -196,6 +1155,7 @@ def process_uploaded_image(image_content: bytes, filename: Optional[str] = None)
                     extracted_text = annotation['textAnnotations'][0].get('description', '')
                 
                 if extracted_text and extracted_text.strip():
+                    engine = "google_vision"
                     print(f"Google Vision extracted {len(extracted_text)} characters from image {filename}")
                 else:
                     print('Google Vision returned no text for image.')
@@ -208,24 +1168,14 @@ def process_uploaded_image(image_content: bytes, filename: Optional[str] = None)
         print("No Google API key configured.")
 
     # If Google Vision failed or returned no text, try EasyOCR fallback
-    if not extracted_text and _EASYOCR_AVAILABLE:
+    if not extracted_text and ocr_pool.available:
         print("Attempting EasyOCR fallback...")
         try:
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_content))
-            # Convert to numpy array for EasyOCR
-            image_np = np.array(image)
-            
-            # Initialize EasyOCR reader (English by default)
-            reader = easyocr.Reader(['en'])
-            
-            # Extract text
-            results = reader.readtext(image_np)
-            
-            # Combine all text results
-            text_parts = [result[1] for result in results if result[1].strip()]
+            # Recognition runs in the EasyOCR worker pool, which keeps its readers loaded
+            text_parts = ocr_pool.read_text(image_content)
             if text_parts:
                 extracted_text = '\n'.join(text_parts)
+                engine = "easyocr"
                 print(f"EasyOCR extracted {len(extracted_text)} characters from image {filename}")
             else:
                 print("EasyOCR found no text in image.")
@@ -235,13 +1185,48 @@ def process_uploaded_image(image_content: bytes, filename: Optional[str] = None)
     elif not extracted_text:
         print("EasyOCR not available and Google Vision failed.")
 
-    # If no text extracted by either method
-    if not extracted_text or not extracted_text.strip():
-        print("No text could be extracted from image.")
-        return None
-        
-    # Create LangChain Document and add to cumulative vector store
+    return extracted_text, engine
+
+
+def _ocr_cached(image_hash: str, image_content: bytes, filename: Optional[str] = None):
+    """_extract_image_text through the OCR cache, with concurrent identical images sharing one call."""
+    cached = ocr_cache.get(image_hash)
+    if cached is not None:
+        print(f"OCR cache hit for image {filename} ({cached['engine']})")
+        return cached["text"], cached["engine"]
+
+    def extract():
+        extracted_text, engine = _extract_image_text(image_content, filename)
+        if extracted_text and extracted_text.strip():
+            ocr_cache.set(image_hash, {"text": extracted_text, "engine": engine})
+        return extracted_text, engine
+
+    return ocr_flight.run(image_hash, extract)
+
+
+def process_uploaded_image(store: DocumentStore, image_content: bytes, filename: Optional[str] = None) -> Optional[str]:
+    """
+    Extracts text from an uploaded image and indexes it into store.
+    OCR results are cached by image hash, and an image whose text is already
+    indexed (or being indexed by a concurrent upload) is not embedded again.
+    Returns extracted text on success, None on failure.
+    """
+    image_hash = content_hash(image_content)
+    # Claimed before OCR so the store counts as busy until the image is indexed
+    claimed = store.begin_ingest(image_hash)
     try:
+        extracted_text, engine = _ocr_cached(image_hash, image_content, filename)
+
+        # If no text extracted by either method
+        if not extracted_text or not extracted_text.strip():
+            print("No text could be extracted from image.")
+            return None
+
+        # The same image was indexed before (or is being indexed); its chunks are or will be searchable
+        if not claimed:
+            print(f"Image {filename} already indexed or being ingested; skipping re-embedding")
+            return extracted_text
+
         # Add metadata to help the AI understand this is from an image
         doc = Document(
             page_content=f"[Text extracted from image '{filename or 'uploaded image'}']\n\n{extracted_text}",
@@ -262,18 +1247,35 @@ def process_uploaded_image(image_content: bytes, filename: Optional[str] = None)
             "filename": filename or "image", 
             "source": "image",
             "chunks": len(docs),
-            "text_length": len(extracted_text)
+            "text_length": len(extracted_text),
+            "content_hash": image_hash,
+            "ocr_engine": engine,
         }
         
-        success = document_store.add_documents(docs, file_info)
-        if success:
-            print("Image text indexed successfully and added to vector store.")
-        else:
-            print("Failed to add image text to vector store.")
-            return extracted_text  # Return text even if indexing fails
-        
-        return extracted_text
-        
-    except Exception as e:
-        print(f"Error indexing extracted text: {e}")
-        return extracted_text  # Return text even if indexing fails
\ No newline at end of file
+        try:
+            if store.add_documents(docs, file_info):
+                print("Image text indexed successfully and added to vector store.")
+            else:
+                print("Failed to add image text to vector store.")
+        except Exception as e:
+            print(f"Error indexing extracted text: {e}")
+        return extracted_text  # Returned even if indexing fails
+    finally:
+        if claimed:
+            store.end_ingest(image_hash)
+
+
+async def aprocess_uploaded_document(
+    store: DocumentStore,
+    file_content: bytes,
+    filename: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    progress: Optional[Callable[..., None]] = None,
+):
+    """Async variant of process_uploaded_document that runs on the ingestion thread pool."""
+    return await run_in_ingest_executor(process_uploaded_document, store, file_content, filename, file_hash, progress)
+
+
+async def aprocess_uploaded_image(store: DocumentStore, image_content: bytes, filename: Optional[str] = None) -> Optional[str]:
+    """Async variant of process_uploaded_image that runs on the ingestion thread pool."""
+    return await run_in_ingest_executor(process_uploaded_image, store, image_content, filename)
@@ -0,0 +1,119 @@
+"""
+Server-Sent Events encoding for the chat stream: coalescing of consecutive text chunks into
+fewer frames, and the JSON or compact wire format
+"""
+import asyncio
+import json
+import re
+import time
+from typing import AsyncGenerator, AsyncIterator
+
+# Frame encodings a client can request with ChatRequest.streamFormat
+JSON_FORMAT = "json"
+COMPACT_FORMAT = "compact"
+STREAM_FORMATS = (JSON_FORMAT, COMPACT_FORMAT)
+
+# Keys of payloads that carry only answer text and may be merged with their neighbours
+_TEXT_KEYS = ({"content"}, {"content", "type"})
+
+# SSE line terminators; a data line cannot contain any of them
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+def _is_text(payload: dict) -> bool:
+    return set(payload) in _TEXT_KEYS and payload.get("type", "text") == "text" and isinstance(payload["content"], str)
+
+
+def encode_frame(payload: dict, stream_format: str = JSON_FORMAT) -> str:
+    """
+    One SSE frame. The JSON format sends every payload as `data: {json}`. The compact format
+    sends text chunks as raw `data:` lines (one per line of text, which SSE clients join with
+    "\\n") and everything else as JSON under `event: json`.
+    """
+    if stream_format == COMPACT_FORMAT:
+        if _is_text(payload):
+            lines = _LINE_BREAK.split(payload["content"])
+            return "".join(f"data: {line}\n" for line in lines) + "\n"
+        return f"event: json\ndata: {json.dumps(payload)}\n\n"
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def coalesce_frames(
+    payloads: AsyncGenerator[dict, None],
+    flush_ms: float,
+    flush_bytes: int,
+    stream_format: str = JSON_FORMAT,
+) -> AsyncIterator[str]:
+    """
+    Encode a stream of payloads as SSE frames, merging consecutive text chunks: the first
+    chunk is sent immediately (time-to-first-token is unchanged), later ones are buffered
+    until flush_ms have passed since the last frame or flush_bytes characters are waiting.
+    Any other payload (images, done, errors) flushes the buffer and is sent as is.
+    flush_ms=0 sends every chunk in its own frame.
+    """
+    buffer = []
+    buffered = 0
+    shape = None  # payload of the buffered chunks, without their content
+    sent_text = False
+    last_flush = time.monotonic()
+    pending = None
+
+    def flush():
+        nonlocal buffer, buffered, last_flush
+        frame = encode_frame({"content": "".join(buffer), **shape}, stream_format)
+        buffer = []
+        buffered = 0
+        last_flush = time.monotonic()
+        return frame
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(payloads.__anext__())
+            if buffer:
+                # Wait for the next chunk only until the buffered text is due
+                timeout = max(0.0, last_flush + flush_ms / 1000 - time.monotonic())
+                await asyncio.wait({pending}, timeout=timeout)
+                if not pending.done():
+                    yield flush()
+                    continue
+            try:
+                payload = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                if pending.done():
+                    pending = None
+
+            if not _is_text(payload):
+                if buffer:
+                    yield flush()
+                yield encode_frame(payload, stream_format)
+                continue
+
+            chunk_shape = {key: value for key, value in payload.items() if key != "content"}
+            if buffer and chunk_shape != shape:
+                yield flush()
+            shape = chunk_shape
+            buffer.append(payload["content"])
+            buffered += len(payload["content"])
+            if (
+                not sent_text
+                or flush_ms <= 0
+                or buffered >= flush_bytes
+                or time.monotonic() - last_flush >= flush_ms / 1000
+            ):
+                sent_text = True
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        # Stop the source before closing it (an async generator cannot be closed mid-step)
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, Exception):
+                pass
+        await payloads.aclose()
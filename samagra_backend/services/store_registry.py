@@ -0,0 +1,236 @@
+"""
+Per-session document namespaces: one DocumentStore per session/tenant id, kept in memory
+while in use and evicted to disk when idle or when the global memory cap is reached
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from core.config import settings
+from services.metrics import metrics
+from services.rag_service import DocumentStore, embedding_batcher, embedding_cache, snapshot_executor
+
+# Namespace used when a request carries no session id (keeps single-user clients working)
+DEFAULT_NAMESPACE = "default"
+
+# Session ids are used as directory names, so they are restricted to a safe alphabet
+_NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Small pool that restores evicted namespaces, separate from ingestion so chat lookups never queue behind uploads
+store_loader_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="store-load")
+
+
+def is_valid_namespace(namespace: Optional[str]) -> bool:
+    """True for no id (the default namespace) or a session id made of letters, digits, '-' and '_'."""
+    return not namespace or bool(_NAMESPACE_PATTERN.match(namespace))
+
+
+class StoreRegistry:
+    """
+    Hands out the DocumentStore of a namespace, loading it on first use and evicting by LRU.
+    Stores are leased per request (acquire/release, or the lease context manager) and a
+    leased store is never evicted. Snapshots are read on a small loader pool and written on
+    the snapshot thread, so neither blocks lookups of namespaces that are already loaded.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        persist: bool,
+        max_vectors: int,
+        max_bytes: int,
+        idle_seconds: float,
+        max_total_bytes: int,
+    ):
+        self.data_dir = data_dir
+        self.persist = persist
+        self.max_vectors = max_vectors
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.max_total_bytes = max_total_bytes
+        self._stores = OrderedDict()  # namespace -> DocumentStore, least recently used first
+        self._loading = {}  # namespace -> Event set once its snapshot has been read
+        self._unloading = {}  # namespace -> Event set once its evicted store has been saved
+        self._lock = threading.Lock()
+
+    def acquire(self, namespace: Optional[str] = None) -> DocumentStore:
+        """
+        Lease the store for namespace (None means the default one), restoring it from disk if
+        it was evicted. Every acquire must be paired with a release().
+        """
+        namespace = self._check_namespace(namespace)
+        while True:
+            with self._lock:
+                store = self._lease_loaded(namespace)
+                if store is not None:
+                    break
+                # Wait for a concurrent restore, or for an evicted copy to finish saving
+                pending = self._loading.get(namespace) or self._unloading.get(namespace)
+                if pending is None:
+                    loaded = self._loading[namespace] = threading.Event()
+            if pending is not None:
+                pending.wait()
+                continue
+            store = None
+            try:
+                store = self._load(namespace)
+            finally:
+                with self._lock:
+                    if store is not None:
+                        self._stores[namespace] = store
+                        store._leases += 1
+                    del self._loading[namespace]
+                loaded.set()
+            break
+        self._evict(keep=namespace)
+        return store
+
+    async def aacquire(self, namespace: Optional[str] = None) -> DocumentStore:
+        """Async acquire: a loaded namespace is leased right away, a cold one is restored on the loader pool."""
+        namespace = self._check_namespace(namespace)
+        with self._lock:
+            store = self._lease_loaded(namespace)
+        if store is not None:
+            self._evict(keep=namespace)
+            return store
+
+        future = asyncio.get_running_loop().run_in_executor(store_loader_executor, self.acquire, namespace)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The restore carries on; hand its lease back once it is done
+            future.add_done_callback(lambda done: done.cancelled() or done.exception() or self.release(done.result()))
+            raise
+
+    def release(self, store: DocumentStore):
+        """End a lease taken with acquire()."""
+        with self._lock:
+            store._leases -= 1
+            store.touch()
+
+    @asynccontextmanager
+    async def lease(self, namespace: Optional[str] = None):
+        """`async with store_registry.lease(session_id) as store:` keeps the store loaded for the block."""
+        store = await self.aacquire(namespace)
+        try:
+            yield store
+        finally:
+            self.release(store)
+
+    def _check_namespace(self, namespace: Optional[str]) -> str:
+        namespace = namespace or DEFAULT_NAMESPACE
+        if not is_valid_namespace(namespace):
+            raise ValueError(f"Invalid session id: {namespace!r}")
+        return namespace
+
+    def _lease_loaded(self, namespace: str) -> Optional[DocumentStore]:
+        """Lease the store if it is in memory (caller holds the lock)."""
+        store = self._stores.get(namespace)
+        if store is not None:
+            self._stores.move_to_end(namespace)
+            store._leases += 1
+            store.touch()
+        return store
+
+    def _load(self, namespace: str) -> DocumentStore:
+        store = DocumentStore(
+            persist_dir=self._persist_dir(namespace),
+            embedding_cache=embedding_cache,
+            embedder=embedding_batcher,
+            namespace=namespace,
+            max_vectors=self.max_vectors,
+            max_bytes=self.max_bytes,
+        )
+        store.load()
+        metrics.incr("store_registry.loads")
+        return store
+
+    def _persist_dir(self, namespace: str) -> Optional[str]:
+        if not self.persist:
+            return None
+        if namespace == DEFAULT_NAMESPACE:
+            # Same location as the single shared store used before namespaces existed
+            return os.path.join(self.data_dir, "vector_store")
+        return os.path.join(self.data_dir, "namespaces", namespace)
+
+    def _evict(self, keep: str):
+        """
+        Unload idle namespaces, then least recently used ones until the total fits the global
+        cap. Leased stores are skipped, and the snapshots are written on the snapshot thread.
+        """
+        evicted = []
+        with self._lock:
+            now = time.monotonic()
+            for namespace, store in list(self._stores.items()):
+                if namespace != keep and not store.busy and now - store.last_used > self.idle_seconds:
+                    evicted.append((namespace, "idle"))
+
+            total = self.total_bytes()
+            for namespace, store in list(self._stores.items()):
+                if total <= self.max_total_bytes:
+                    break
+                if namespace == keep or store.busy or (namespace, "idle") in evicted:
+                    continue
+                total -= store.memory_bytes()
+                evicted.append((namespace, "memory cap"))
+
+            for namespace, _ in evicted:
+                self._unloading[namespace] = threading.Event()
+            evicted = [(namespace, self._stores.pop(namespace), reason) for namespace, reason in evicted]
+
+        for namespace, store, reason in evicted:
+            snapshot_executor.submit(self._unload, namespace, store, reason)
+
+    def _unload(self, namespace: str, store: DocumentStore, reason: str):
+        try:
+            store.unload()
+        finally:
+            with self._lock:
+                unloaded = self._unloading.pop(namespace)
+            unloaded.set()
+        metrics.incr("store_registry.evictions")
+        print(f"StoreRegistry: Evicted namespace '{namespace}' ({reason})")
+
+    def save_all(self):
+        """Snapshot every loaded namespace now (at shutdown, so no queued background save is lost)."""
+        with self._lock:
+            stores = list(self._stores.values())
+        for store in stores:
+            store.save()
+
+    def total_bytes(self) -> int:
+        return sum(store.memory_bytes() for store in self._stores.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "namespaces_loaded": len(self._stores),
+                "memory_bytes": self.total_bytes(),
+                "max_total_bytes": self.max_total_bytes,
+                "namespaces": {
+                    namespace: {
+                        "files": len(store.uploaded_files),
+                        "vectors": store.vector_count(),
+                        "memory_bytes": store.memory_bytes(),
+                        "index": store.index_info(),
+                    }
+                    for namespace, store in self._stores.items()
+                },
+            }
+
+
+# Global namespace registry
+store_registry = StoreRegistry(
+    data_dir=settings.DATA_DIR,
+    persist=settings.VECTOR_STORE_PERSIST,
+    max_vectors=settings.NAMESPACE_MAX_VECTORS,
+    max_bytes=settings.NAMESPACE_MAX_MEMORY_MB * 1024 * 1024,
+    idle_seconds=settings.NAMESPACE_IDLE_SECONDS,
+    max_total_bytes=settings.STORE_MAX_MEMORY_MB * 1024 * 1024,
+)
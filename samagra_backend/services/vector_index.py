@@ -0,0 +1,258 @@
+"""
+FAISS index backends for DocumentStore: exact flat search, HNSW graphs and IVF-PQ, optionally
+with float16/int8 scalar-quantized storage, plus the background pool that builds replacement
+indexes as stores grow
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import faiss
+import numpy as np
+
+from core.config import settings
+
+FLAT = "flat"
+HNSW = "hnsw"
+IVFPQ = "ivfpq"
+INDEX_TYPES = (FLAT, HNSW, IVFPQ)
+
+# Storage of flat and HNSW vectors: float32, or scalar-quantized to float16 / int8 per component
+NO_QUANTIZATION = "none"
+_SCALAR_QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+QUANTIZATIONS = (NO_QUANTIZATION, *_SCALAR_QUANTIZERS)
+
+# IVF-PQ needs enough vectors to train its coarse centroids and PQ codebooks (256 codes per sub-quantizer)
+IVFPQ_MIN_TRAINING_VECTORS = 10_000
+# Coarse clustering gets this many training points per list (FAISS warns below 39)
+_TRAINING_POINTS_PER_LIST = 50
+# int8 quantization learns per-dimension ranges, so it waits for a representative sample
+SQ8_MIN_TRAINING_VECTORS = 1_000
+# Learned int8 ranges are widened by this fraction so later vectors are not clipped
+_SQ8_RANGE_MARGIN = 0.1
+
+# Single worker so rebuilds of different stores never compete for CPU with each other
+index_build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-build")
+
+
+def target_index_type(vector_count: int, configured: Optional[str] = None) -> str:
+    """
+    Index type a store of vector_count vectors should use.
+    "auto" moves from flat to HNSW once the store crosses the size threshold. IVF-PQ is lossy
+    and cannot be converted back, so it is only used when configured explicitly, and stays
+    flat until there is enough data to train it.
+    """
+    configured = configured or settings.VECTOR_INDEX_TYPE
+    if configured == "auto":
+        configured = HNSW if vector_count >= settings.VECTOR_INDEX_AUTO_HNSW_MIN_VECTORS else FLAT
+    if configured == IVFPQ and vector_count < IVFPQ_MIN_TRAINING_VECTORS:
+        return FLAT
+    if configured not in INDEX_TYPES:
+        print(f"VectorIndex: Unknown index type '{configured}', using flat")
+        return FLAT
+    return configured
+
+
+def target_quantization(vector_count: int, kind: str) -> str:
+    """Storage quantization for a store of vector_count vectors using index type kind."""
+    configured = settings.VECTOR_QUANTIZATION
+    if configured not in QUANTIZATIONS:
+        print(f"VectorIndex: Unknown quantization '{configured}', storing float32")
+        return NO_QUANTIZATION
+    # IVF-PQ already stores compressed product-quantized codes
+    if kind == IVFPQ:
+        return NO_QUANTIZATION
+    if configured == "int8" and vector_count < SQ8_MIN_TRAINING_VECTORS:
+        return NO_QUANTIZATION
+    return configured
+
+
+def index_quantization(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for name, qtype in _SCALAR_QUANTIZERS.items():
+            if index.sq.qtype == qtype:
+                return name
+    return NO_QUANTIZATION
+
+
+def index_type(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return HNSW
+    if isinstance(index, faiss.IndexIVF):
+        return IVFPQ
+    return FLAT
+
+
+def build_index(
+    kind: str, dim: int, vectors: Optional[np.ndarray] = None, quantization: str = NO_QUANTIZATION
+):
+    """Create an empty index of the given type and storage, training it on vectors when it needs it."""
+    if kind == IVFPQ:
+        if vectors is None or len(vectors) < IVFPQ_MIN_TRAINING_VECTORS:
+            raise ValueError("IVF-PQ needs training vectors")
+        nlist = max(1, min(settings.IVF_NLIST, int(4 * math.sqrt(len(vectors)))))
+        index = _build_ivfpq(dim, vectors, nlist)
+    else:
+        qtype = _SCALAR_QUANTIZERS.get(quantization)
+        if kind == HNSW:
+            if qtype is None:
+                index = faiss.IndexHNSWFlat(dim, settings.HNSW_M)
+            else:
+                index = faiss.IndexHNSWSQ(dim, qtype, settings.HNSW_M)
+            index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        elif qtype is None:
+            index = faiss.IndexFlatL2(dim)
+        else:
+            index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+        if not index.is_trained:
+            if vectors is None or not len(vectors):
+                raise ValueError(f"{quantization} quantization needs training vectors")
+            sq = faiss.downcast_index(index.storage).sq if kind == HNSW else index.sq
+            sq.rangestat_arg = _SQ8_RANGE_MARGIN
+            index.train(vectors)
+    set_search_params(index)
+    return index
+
+
+def _build_ivfpq(dim: int, vectors: np.ndarray, nlist: int):
+    quantizer = faiss.IndexFlatL2(dim)
+    index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8)
+    sample_size = min(len(vectors), nlist * _TRAINING_POINTS_PER_LIST)
+    sample = vectors[np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)]
+    index.train(sample)
+    return index
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest sub-quantizer count up to IVFPQ_M that divides the dimension."""
+    for m in range(min(settings.IVFPQ_M, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def set_search_params(index, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+    """
+    Apply the recall/latency knobs of an index: HNSW efSearch (candidate list size) or
+    IVF nprobe (lists scanned). Higher values find more true neighbours but search slower.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or settings.HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe or settings.IVF_NPROBE
+
+
+def search_params(index) -> dict:
+    """Current recall/latency knobs of an index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return {"ef_search": index.hnsw.efSearch}
+    if isinstance(index, faiss.IndexIVF):
+        return {"nprobe": index.nprobe, "nlist": index.nlist}
+    return {}
+
+
+def estimate_recall(sample: np.ndarray, like, k: int = 10, max_queries: int = 100) -> Optional[float]:
+    """
+    Recall@k of an index configured like `like` (type, quantization, search parameters)
+    against exact float32 search, measured on a sample of original vectors. Up to
+    max_queries of them (at most a fifth) are held out as queries and the rest are
+    indexed, so no query finds itself. IVF-PQ is scaled down to the sample with the
+    same fraction of lists probed.
+    """
+    query_count = min(max_queries, len(sample) // 5)
+    queries, vectors = sample[:query_count], sample[query_count:]
+    if not query_count or len(vectors) <= k:
+        return None
+    dim = sample.shape[1]
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+
+    kind = index_type(like)
+    if kind == IVFPQ:
+        # PQ codebooks need at least 256 training points
+        if len(vectors) < 256:
+            return None
+        real = faiss.downcast_index(like)
+        nlist = max(1, len(vectors) // _TRAINING_POINTS_PER_LIST)
+        candidate = _build_ivfpq(dim, vectors, nlist)
+        candidate.nprobe = max(1, round(real.nprobe * nlist / real.nlist))
+    else:
+        candidate = build_index(kind, dim, vectors, index_quantization(like))
+        params = search_params(like)
+        set_search_params(candidate, params.get("ef_search"))
+    candidate.add(vectors)
+
+    _, truth = exact.search(queries, k)
+    _, found = candidate.search(queries, k)
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    return hits / (len(queries) * k)
+
+
+def reconstruct_vectors(index, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+    """Stored vectors [start, end) of a flat or HNSW index, decoded if quantized (IVF-PQ only keeps compressed codes)."""
+    end = index.ntotal if end is None else end
+    if end <= start:
+        return np.zeros((0, index.d), dtype="float32")
+    return index.reconstruct_n(start, end - start)
+
+
+def without_vectors(index, positions):
+    """
+    Copy of an index without the vectors at positions; the others keep their order, so later
+    positions shift down. IVF-PQ keeps only compressed codes, so its entries are re-added from
+    their decoded approximations with the same trained quantizers.
+    """
+    removed = np.zeros(index.ntotal, dtype=bool)
+    removed[list(positions)] = True
+    # Works on a copy, so the live index is only read and searches can continue on it
+    new_index = faiss.clone_index(index)
+    ivf = faiss.extract_index_ivf(new_index) if index_type(new_index) == IVFPQ else None
+    if ivf is not None:
+        ivf.make_direct_map()
+    vectors = reconstruct_vectors(new_index)[~removed]
+    if ivf is not None:
+        ivf.make_direct_map(False)
+    new_index.reset()
+    if len(vectors):
+        new_index.add(vectors)
+    set_search_params(new_index)
+    return new_index
+
+
+def can_reconstruct(index) -> bool:
+    return index_type(index) != IVFPQ
+
+
+def read_index(path: str):
+    """
+    Read an index from disk, memory-mapping it where FAISS still allows appending
+    (IVF inverted lists are read-only when mapped, so those are loaded into memory).
+    """
+    index = faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    if index_type(index) == IVFPQ:
+        index = faiss.read_index(path)
+    set_search_params(index)
+    return index
+
+
+def index_memory_bytes(index) -> int:
+    """Approximate memory held by an index: stored codes plus graph links or coarse centroids."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        storage = faiss.downcast_index(index.storage)
+        code_size = getattr(storage, "code_size", index.d * 4)
+        # Level-0 links dominate: 2 * M neighbour ids of 4 bytes per vector
+        return index.ntotal * (code_size + index.hnsw.nb_neighbors(0) * 4)
+    if isinstance(index, faiss.IndexIVF):
+        # PQ code plus the 8-byte id kept in the inverted lists, and the coarse centroids
+        return index.ntotal * (index.code_size + 8) + index.nlist * index.d * 4
+    return index.ntotal * getattr(index, "code_size", index.d * 4)
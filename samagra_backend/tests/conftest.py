@@ -0,0 +1,29 @@
+"""
+Test setup: an offline configuration, set before the app modules read their settings, and
+deterministic fake embeddings in place of Gemini
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="samagra_tests_")
+os.environ["EMBEDDING_DIMENSIONS"] = "8"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+from langchain_community.embeddings import DeterministicFakeEmbedding  # noqa: E402
+
+from services import rag_service  # noqa: E402
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    model: str = "fake-embedding"
+
+
+def _fake_embeddings():
+    return FakeEmbeddings(size=8)
+
+
+rag_service._create_embeddings = _fake_embeddings
+rag_service.embedding_batcher.embeddings_factory = _fake_embeddings
@@ -0,0 +1,53 @@
+from services import answer_cache as answer_cache_module
+from services.answer_cache import SemanticAnswerCache
+
+QUESTION = [1.0, 0.0, 0.0]
+SIMILAR = [0.99, 0.1, 0.0]
+DIFFERENT = [0.0, 1.0, 0.0]
+
+
+def _cache(**options):
+    settings = dict(max_entries=8, ttl_seconds=60, similarity_threshold=0.95)
+    settings.update(options)
+    return SemanticAnswerCache("test_answer_cache", **settings)
+
+
+def test_similar_question_in_the_same_scope_hits():
+    cache = _cache()
+    cache.set("flash", "rag", 1, QUESTION, "What is the rating?", "40 bar")
+
+    assert cache.get("flash", "rag", 1, SIMILAR) == "40 bar"
+    assert cache.get("flash", "rag", 1, DIFFERENT) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_answers_are_scoped_by_model_prompt_and_corpus_version():
+    cache = _cache()
+    cache.set("flash", "rag", 1, QUESTION, "What is the rating?", "40 bar")
+
+    assert cache.get("pro", "rag", 1, QUESTION) is None
+    assert cache.get("flash", "rag_stream", 1, QUESTION) is None
+    assert cache.get("flash", "rag", 2, QUESTION) is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now[0])
+    cache = _cache()
+    cache.set("flash", "rag", 1, QUESTION, "What is the rating?", "40 bar")
+
+    now[0] += 61
+    assert cache.get("flash", "rag", 1, QUESTION) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _cache(max_entries=2)
+    cache.set("flash", "rag", 1, QUESTION, "first", "a")
+    cache.set("flash", "rag", 1, DIFFERENT, "second", "b")
+    assert cache.get("flash", "rag", 1, QUESTION) == "a"
+
+    cache.set("flash", "rag", 1, [0.0, 0.0, 1.0], "third", "c")
+
+    assert cache.get("flash", "rag", 1, QUESTION) == "a"
+    assert cache.get("flash", "rag", 1, DIFFERENT) is None
@@ -0,0 +1,71 @@
+import asyncio
+
+from langchain.schema import Document
+
+from services import chat_service
+from services.answer_cache import SemanticAnswerCache
+from services.chat_service import _lookup_answer, _route_retrieval
+from services.metrics import TurnTimer
+from services.rag_service import LEXICAL_MATCH, DocumentStore
+
+
+def _scored(score, **metadata):
+    return [(Document(page_content="The XJ-220 pump is rated for 40 bar.", metadata=metadata), score)]
+
+
+def test_turn_below_the_relevance_threshold_uses_general_chat():
+    timer = TurnTimer("test")
+    assert _route_retrieval(_scored(0.1), timer) is None
+    assert timer.details["best_score"] == 0.1
+
+
+def test_relevant_or_freshly_indexed_chunks_use_rag():
+    assert _route_retrieval(_scored(0.9), TurnTimer("test"))
+    assert _route_retrieval(_scored(0.1), TurnTimer("test"), force_rag=True)
+
+
+def test_decisive_lexical_match_uses_rag_without_a_cosine_score():
+    timer = TurnTimer("test")
+    assert _route_retrieval(_scored(0.1, **{LEXICAL_MATCH: True}), timer)
+    assert timer.details["lexical_match"] and "best_score" not in timer.details
+
+
+def _lookup(store, monkeypatch, message):
+    monkeypatch.setattr(chat_service, "answer_cache", SemanticAnswerCache("test_answer_cache", 8, 60, 0.95))
+    embedded = []
+    embed = store.aembed_query
+
+    async def recording_embed(query):
+        embedded.append(query)
+        return await embed(query)
+
+    monkeypatch.setattr(store, "aembed_query", recording_embed)
+    timer = TurnTimer("test")
+    return asyncio.run(_lookup_answer(store, message, "flash", "rag", timer)), embedded, timer
+
+
+def test_answer_lookup_embeds_the_question_for_the_cache(monkeypatch):
+    store = DocumentStore()
+    store.add_documents([Document(page_content="The pump is rated for 40 bar.")], {"filename": "a.pdf"})
+
+    (answer, embedding), embedded, timer = _lookup(store, monkeypatch, "How strong is the pump?")
+
+    assert answer is None and embedding is not None
+    assert embedded == ["How strong is the pump?"]
+    assert timer.details["answer_cache"] == "miss"
+
+
+def test_answer_lookup_is_skipped_for_a_decisive_lexical_match(monkeypatch):
+    store = DocumentStore()
+    texts = (
+        "The XJ-220 pump is rated for 40 bar.",
+        "Replace the seals every two years.",
+        "The warranty covers parts and labour.",
+        "Contact support for a replacement.",
+    )
+    store.add_documents([Document(page_content=text) for text in texts], {"filename": "a.pdf"})
+
+    (answer, embedding), embedded, timer = _lookup(store, monkeypatch, "What is the rating of the XJ-220?")
+
+    assert (answer, embedding) == (None, None)
+    assert embedded == [] and "answer_cache" not in timer.details
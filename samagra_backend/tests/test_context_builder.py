@@ -0,0 +1,76 @@
+from langchain.schema import Document
+
+from services.context_builder import build_context, compress_chunks, estimate_tokens
+
+
+def _scored(*pairs):
+    return [(Document(page_content=text), score) for text, score in pairs]
+
+
+def _pack(scored, token_budget=1000, min_relative_score=0.5, duplicate_containment=0.8):
+    return build_context(scored, token_budget, min_relative_score, duplicate_containment)
+
+
+def test_tokens_are_estimated_from_characters():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_low_scoring_chunks_are_dropped_but_the_best_is_kept():
+    docs, report = _pack(_scored(("pump rating is 40 bar", 0.2), ("seals last two years", 0.05)))
+
+    assert [doc.page_content for doc in docs] == ["pump rating is 40 bar"]
+    assert report["dropped"]["low_score"] == 1
+
+
+def test_contained_chunks_are_dropped_as_duplicates():
+    text = "the pump is rated for forty bar at room temperature"
+    docs, report = _pack(_scored((text + " and sea level", 0.9), (text, 0.8), ("replace the seals every two years", 0.7)))
+
+    assert [doc.page_content for doc in docs] == [text + " and sea level", "replace the seals every two years"]
+    assert report["dropped"]["duplicate"] == 1
+
+
+def test_chunks_are_packed_in_rank_order_while_they_fit():
+    scored = _scored(("a" * 40, 0.9), ("b" * 40, 0.8), ("c" * 8, 0.7))
+    docs, report = _pack(scored, token_budget=12)
+
+    assert [doc.page_content[0] for doc in docs] == ["a", "c"]
+    assert report["dropped"]["budget"] == 1
+    assert (report["tokens_retrieved"], report["tokens_packed"], report["tokens_saved"]) == (22, 12, 10)
+
+
+def test_the_top_chunk_is_kept_even_over_budget():
+    docs, report = _pack(_scored(("a" * 400, 0.9)), token_budget=10)
+    assert len(docs) == 1 and report["tokens_packed"] == 100
+
+
+
+CHUNK = (
+    "The XJ-220 pump ships in a blue crate. "
+    "Its maximum pressure rating is 40 bar. "
+    "The seals should be replaced every two years. "
+    "Support is available on weekdays."
+)
+
+
+def test_compression_keeps_the_sentences_that_match_the_question_in_order():
+    compressed, report = compress_chunks(_scored((CHUNK, 0.8)), "What is the pressure rating of the XJ-220?", 2)
+
+    doc, score = compressed[0]
+    assert doc.page_content == "The XJ-220 pump ships in a blue crate. Its maximum pressure rating is 40 bar."
+    assert doc.metadata["compressed"] and score == 0.8
+    assert report["chars_in"] == len(CHUNK) and report["chars_out"] == len(doc.page_content)
+    assert report["ratio"] < 1
+
+
+def test_chunks_without_matching_sentences_or_already_short_are_kept_whole():
+    scored = _scored((CHUNK, 0.8), ("Its maximum pressure rating is 40 bar.", 0.7))
+    compressed, report = compress_chunks(scored, "How do I get a refund?", 1)
+
+    assert [doc.page_content for doc, _ in compressed] == [CHUNK, "Its maximum pressure rating is 40 bar."]
+    assert report["ratio"] == 1.0
+
+    short, _ = compress_chunks(scored[1:], "What is the pressure rating?", 1)
+    assert "compressed" not in short[0][0].metadata
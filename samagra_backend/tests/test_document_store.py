@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import threading
+
+from langchain.schema import Document
+
+from services import rag_service
+from services.rag_service import DocumentStore
+
+
+def _store(tmp_path=None):
+    return DocumentStore(persist_dir=str(tmp_path / "store") if tmp_path else None)
+
+
+def _docs(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def _add(store, filename, *texts):
+    store.add_documents(_docs(*texts), {"filename": filename, "content_hash": filename})
+
+
+def test_async_search_does_not_block_the_event_loop_on_the_store_lock():
+    store = _store()
+    _add(store, "a.pdf", "alpha beta gamma", "delta epsilon")
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        # An index write holds the lock for a while; the search waits for it on the search pool
+        store._lock.acquire()
+        asyncio.get_running_loop().call_later(0.3, store._lock.release)
+        results = await store.asearch_with_scores("alpha")
+        ticker.cancel()
+        return ticks, results
+
+    ticks, results = asyncio.run(main())
+    assert ticks >= 10
+    assert results
+
+
+def test_searches_continue_while_a_change_holds_the_write_lock():
+    store = _store()
+    _add(store, "a.pdf", "alpha beta gamma")
+    holding = threading.Event()
+    release = threading.Event()
+
+    def long_read_only_work():
+        with store._write_lock:
+            holding.set()
+            release.wait()
+
+    worker = threading.Thread(target=long_read_only_work)
+    worker.start()
+    holding.wait()
+    try:
+        assert store.search_with_scores("alpha")
+    finally:
+        release.set()
+        worker.join()
+
+
+def _wait_for_snapshots():
+    rag_service.snapshot_executor.submit(lambda: None).result()
+
+
+def _restored(tmp_path):
+    # Background saves queued by uploads must finish before another store reads the directory
+    _wait_for_snapshots()
+    store = _store(tmp_path)
+    assert store.load()
+    return store
+
+
+def _texts(store):
+    index_to_id = store.vector_db.index_to_docstore_id
+    return [store.vector_db.docstore.search(index_to_id[i]).page_content for i in range(len(index_to_id))]
+
+
+def _crash_before_commit(monkeypatch):
+    """Make the next save fail just before its manifest replaces the committed one."""
+    def fail(path, writer):
+        if path.endswith("manifest.json"):
+            raise OSError("simulated crash")
+        writer(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+    monkeypatch.setattr(rag_service, "_atomic_write", fail)
+
+
+def test_snapshot_is_restored(tmp_path):
+    store = _store(tmp_path)
+    _add(store, "a.pdf", "alpha beta", "gamma delta")
+    assert store.save()
+
+    restored = _restored(tmp_path)
+    assert _texts(restored) == ["alpha beta", "gamma delta"]
+    assert restored.get_file_list() == ["a.pdf"]
+    assert restored.search_with_scores("alpha beta", k=1)[0][0].page_content == "alpha beta"
+
+
+def test_saves_append_chunks_and_skip_an_unchanged_index(tmp_path):
+    store = _store(tmp_path)
+    _add(store, "a.pdf", "alpha beta", "gamma delta")
+    store.save()
+    first = json.loads((tmp_path / "store" / "manifest.json").read_text())
+
+    store.save()
+    assert json.loads((tmp_path / "store" / "manifest.json").read_text())["index_file"] == first["index_file"]
+
+    _add(store, "b.pdf", "epsilon zeta")
+    store.save()
+    _wait_for_snapshots()
+    manifest = json.loads((tmp_path / "store" / "manifest.json").read_text())
+    assert manifest["chunks_file"] == first["chunks_file"]
+    assert manifest["index_file"] != first["index_file"]
+    assert sorted(os.listdir(tmp_path / "store")) == sorted(
+        ["manifest.json", "sample.npy", manifest["index_file"], manifest["chunks_file"]]
+    )
+    assert _texts(_restored(tmp_path)) == ["alpha beta", "gamma delta", "epsilon zeta"]
+
+
+def test_crash_before_the_manifest_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    _add(store, "a.pdf", "alpha beta", "gamma delta")
+    store.save()
+    with monkeypatch.context() as patch:
+        _crash_before_commit(patch)
+        _add(store, "b.pdf", "epsilon zeta")
+        assert not store.save()
+        _wait_for_snapshots()
+
+    assert _texts(_restored(tmp_path)) == ["alpha beta", "gamma delta"]
+    assert store.save()
+    assert _texts(_restored(tmp_path)) == ["alpha beta", "gamma delta", "epsilon zeta"]
+
+
+def test_snapshot_with_a_mismatched_index_is_ignored(tmp_path):
+    store = _store(tmp_path)
+    _add(store, "a.pdf", "alpha beta")
+    store.save()
+    _wait_for_snapshots()
+    manifest_path = tmp_path / "store" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest["chunk_count"] = 2
+    manifest_path.write_text(json.dumps(manifest))
+
+    assert not _store(tmp_path).load()
+
+
+class _FakeParser:
+    """Stands in for pdf_parser: one page per text, with pages_parsed checked as they are consumed."""
+
+    def __init__(self, *texts):
+        self.texts = texts
+
+    def parse(self, file_content, filename):
+        pages = (Document(page_content=text, metadata={"page": i}) for i, text in enumerate(self.texts))
+        return len(self.texts), pages
+
+
+def _ingest(store, monkeypatch, *texts, batch_size=1):
+    monkeypatch.setattr(rag_service, "pdf_parser", _FakeParser(*texts))
+    monkeypatch.setattr(rag_service.settings, "INGEST_INDEX_BATCH_SIZE", batch_size)
+    updates = []
+    result = rag_service.process_uploaded_document(
+        store, b"%PDF", "doc.pdf", "hash", progress=lambda **update: updates.append(update)
+    )
+    return result, updates
+
+
+def test_upload_reports_embedding_from_the_first_batch(monkeypatch):
+    store = _store()
+    result, updates = _ingest(store, monkeypatch, "page one", "page two", "page three")
+
+    assert result
+    pages_parsed = 0
+    for update in updates:
+        pages_parsed = update.get("pages_parsed", pages_parsed)
+        if update.get("status") == "embedding":
+            break
+    assert pages_parsed == 1
+    assert store.vector_count() == 3
+
+
+def test_failed_upload_is_rolled_back(monkeypatch):
+    store = _store()
+    _add(store, "a.pdf", "alpha beta")
+    embed = store.embed_documents
+    calls = []
+
+    def fail_on_second_batch(docs):
+        calls.append(docs)
+        if len(calls) == 2:
+            raise RuntimeError("embedding failed")
+        return embed(docs)
+
+    monkeypatch.setattr(store, "embed_documents", fail_on_second_batch)
+    result, _ = _ingest(store, monkeypatch, "page one", "page two")
+
+    assert result is False
+    assert _texts(store) == ["alpha beta"]
+    assert store.get_file_list() == ["a.pdf"]
+    assert store.lexical_index.search("page", 5) == []
+    assert store.begin_ingest("hash")
+
+
+def test_removed_chunks_survive_a_crash_until_the_next_save(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    _add(store, "a.pdf", "alpha beta", "gamma delta")
+    _add(store, "b.pdf", "epsilon zeta")
+    store.save()
+    removed = [store.vector_db.index_to_docstore_id[0]]
+
+    with monkeypatch.context() as patch:
+        _crash_before_commit(patch)
+        store.remove_documents(removed)
+        assert _texts(store) == ["gamma delta", "epsilon zeta"]
+        assert not store.save()
+        _wait_for_snapshots()
+    assert _texts(_restored(tmp_path)) == ["alpha beta", "gamma delta", "epsilon zeta"]
+
+    assert store.save()
+    restored = _restored(tmp_path)
+    assert _texts(restored) == ["gamma delta", "epsilon zeta"]
+    assert restored.search_with_scores("epsilon zeta", k=1)[0][0].page_content == "epsilon zeta"
+
+
+PARTS = (
+    "The XJ-220 pump is rated for 40 bar.",
+    "Replace the seals of the pump every two years.",
+    "Firmware v2.1.3 fixes the pressure sensor drift.",
+    "The warranty covers parts and labour.",
+    "Contact support for a replacement.",
+)
+
+
+def test_lexical_hits_are_fused_with_vector_results():
+    store = _store()
+    _add(store, "manual.pdf", *PARTS)
+
+    results = store.search_with_scores("seals", k=3)
+
+    assert results[0][0].page_content == PARTS[1]
+    assert not any(doc.metadata.get(rag_service.LEXICAL_MATCH) for doc, _ in results)
+
+
+def test_decisive_lexical_match_skips_the_query_embedding(monkeypatch):
+    store = _store()
+    _add(store, "manual.pdf", *PARTS)
+
+    def no_embedding(query):
+        raise AssertionError("query was embedded")
+
+    monkeypatch.setattr(store, "embed_query", no_embedding)
+    assert store.has_decisive_lexical_match("What is the rating of the XJ-220?")
+    results = store.search_with_scores("What is the rating of the XJ-220?")
+
+    doc, score = results[0]
+    assert doc.page_content == PARTS[0] and score == 1.0
+    assert all(doc.metadata[rag_service.LEXICAL_MATCH] for doc, _ in results)
+    assert not store.vector_db.docstore.search(doc.id).metadata.get(rag_service.LEXICAL_MATCH)
@@ -0,0 +1,55 @@
+import pytest
+
+from services import embedding_cache as embedding_cache_module
+from services.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that advances on every read, so LRU order never depends on timer resolution."""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(embedding_cache_module.time, "time", tick)
+
+
+def _cache(tmp_path, max_entries=10):
+    return EmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite3"), max_entries)
+
+
+def test_cached_vectors_are_returned_by_position(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many("model-a", ["alpha", "beta"], [[1.0, 2.0], [3.0, 4.0]])
+
+    assert cache.get_many("model-a", ["gamma", "beta", "alpha"]) == {1: [3.0, 4.0], 2: [1.0, 2.0]}
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_vectors_are_keyed_by_model(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many("model-a", ["alpha"], [[1.0, 2.0]])
+
+    assert cache.get_many("model-b", ["alpha"]) == {}
+
+
+def test_entries_survive_a_reopen(tmp_path):
+    _cache(tmp_path).put_many("model-a", ["alpha", "alpha"], [[1.0, 2.0], [1.0, 2.0]])
+
+    reopened = _cache(tmp_path)
+    assert reopened.stats()["entries"] == 1
+    assert reopened.get_many("model-a", ["alpha"]) == {0: [1.0, 2.0]}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.put_many("model-a", ["alpha"], [[1.0]])
+    cache.put_many("model-a", ["beta"], [[2.0]])
+    cache.get_many("model-a", ["alpha"])
+
+    cache.put_many("model-a", ["gamma"], [[3.0]])
+
+    assert cache.stats()["entries"] == 2
+    assert cache.get_many("model-a", ["alpha", "beta", "gamma"]) == {0: [1.0], 2: [3.0]}
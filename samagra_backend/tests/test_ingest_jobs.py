@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from services import ingest_jobs as ingest_jobs_module
+from services.ingest_jobs import IngestJobManager
+from services.rag_service import StoreCapacityError
+
+
+async def _finished(job, timeout=2.0):
+    async def poll():
+        while not job.finished:
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+    return job
+
+
+@pytest.fixture
+def process(monkeypatch):
+    """Replace the ingestion pipeline; tests set .result (a value or an exception) and can hold jobs on .gate."""
+    class FakeProcess:
+        result = True
+        gate = None
+
+        async def __call__(self, store, file_content, filename, file_hash, progress):
+            self.calls.append((store, filename))
+            progress(status="parsing", total_pages=2)
+            progress(pages_parsed=2, status="embedding", chunks_embedded=3, vectors_indexed=3)
+            if self.gate is not None:
+                await self.gate.wait()
+            if isinstance(self.result, Exception):
+                raise self.result
+            return self.result
+
+    fake = FakeProcess()
+    fake.calls = []
+    monkeypatch.setattr(ingest_jobs_module, "aprocess_uploaded_document", fake)
+    return fake
+
+
+def test_job_reports_progress_and_completes(process):
+    async def run():
+        job = IngestJobManager(max_concurrent=2).submit(b"%PDF", "a.pdf", "hash-a", "alice")
+        assert job.status == "queued"
+        return await _finished(job)
+
+    job = asyncio.run(run()).to_dict()
+    assert job["status"] == "completed"
+    assert job["session_id"] == "alice"
+    assert (job["total_pages"], job["pages_parsed"], job["vectors_indexed"]) == (2, 2, 3)
+    assert job["error"] is None and job["finished_at"] is not None
+    store, filename = process.calls[0]
+    assert (store.namespace, filename) == ("alice", "a.pdf")
+
+
+def test_store_is_leased_while_the_job_runs(process):
+    async def run():
+        process.gate = asyncio.Event()
+        job = IngestJobManager(max_concurrent=1).submit(b"%PDF", "a.pdf", "hash-a", "leased")
+        while not process.calls:
+            await asyncio.sleep(0.01)
+        store = process.calls[0][0]
+        assert store.busy
+        process.gate.set()
+        await _finished(job)
+        return store
+
+    assert not asyncio.run(run()).busy
+
+
+def test_identical_upload_in_progress_is_reused(process):
+    async def run():
+        process.gate = asyncio.Event()
+        manager = IngestJobManager(max_concurrent=2)
+        first = manager.submit(b"%PDF", "a.pdf", "hash-a", "alice")
+        again = manager.submit(b"%PDF", "a.pdf", "hash-a", "alice")
+        other_session = manager.submit(b"%PDF", "a.pdf", "hash-a", "bob")
+        process.gate.set()
+        await asyncio.gather(*(_finished(job) for job in (first, other_session)))
+        return first, again, other_session, manager
+
+    first, again, other_session, manager = asyncio.run(run())
+    assert again is first
+    assert other_session is not first
+    assert manager.get(first.id) is first
+
+
+def test_failed_job_records_the_error(process):
+    process.result = StoreCapacityError("Namespace 'alice' is full")
+
+    async def run():
+        return await _finished(IngestJobManager(max_concurrent=1).submit(b"%PDF", "a.pdf", "hash-a", "alice"))
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error == "Namespace 'alice' is full"
+
+
+def test_unsuccessful_job_is_reported_as_failed(process):
+    process.result = False
+
+    async def run():
+        return await _finished(IngestJobManager(max_concurrent=1).submit(b"%PDF", "a.pdf", "hash-a"))
+
+    job = asyncio.run(run())
+    assert (job.status, job.error) == ("failed", "Failed to process the document")
+
+
+def test_at_most_max_concurrent_jobs_run(process):
+    async def run():
+        process.gate = asyncio.Event()
+        manager = IngestJobManager(max_concurrent=1)
+        first = manager.submit(b"%PDF", "a.pdf", "hash-a", "alice")
+        second = manager.submit(b"%PDF", "b.pdf", "hash-b", "alice")
+        await asyncio.sleep(0.1)
+        statuses = (first.status, second.status)
+        process.gate.set()
+        await asyncio.gather(_finished(first), _finished(second))
+        return statuses, first, second
+
+    statuses, first, second = asyncio.run(run())
+    assert statuses == ("embedding", "queued")
+    assert first.status == second.status == "completed"
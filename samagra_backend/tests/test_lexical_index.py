@@ -0,0 +1,75 @@
+import pytest
+
+from services.lexical_index import LexicalIndex, is_identifier, tokenize
+
+RATIO = 2.0
+MIN_IDF = 1.0
+
+
+def _index(*texts):
+    index = LexicalIndex()
+    index.add(texts)
+    return index
+
+
+CORPUS = (
+    "The XJ-220 pump is rated for 40 bar and was founded in 1998.",
+    "Maintenance of the pump: replace the seals every 2 years.",
+    "Firmware v2.1.3 fixes the pressure sensor drift.",
+    "The company was founded in 1998 in Leeds.",
+    "Order 4417702 shipped on 2024-01-15.",
+)
+
+
+def test_joined_identifiers_are_indexed_whole_and_by_part():
+    assert tokenize("Part XJ-220, firmware v2.1") == ["part", "xj-220", "xj", "220", "firmware", "v2.1", "v2", "1"]
+
+
+@pytest.mark.parametrize("term", ["xj-220", "xj220", "v2.1", "v2.1.3", "4417702", "2024-01-15"])
+def test_codes_are_identifiers(term):
+    assert is_identifier(term)
+
+
+@pytest.mark.parametrize("term", ["1998", "2", "40", "3.14", "pump", "e-mail", "v2"])
+def test_words_years_and_short_numbers_are_not_identifiers(term):
+    assert not is_identifier(term)
+
+
+def test_bm25_ranks_rarer_and_more_frequent_terms_higher():
+    index = _index("pump pump seals", "pump manual", "sensor drift")
+
+    hits = index.search("pump seals", 3)
+
+    assert [position for position, _ in hits] == [0, 1]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("nothing here", 3) == []
+
+
+def test_identifier_match_is_decisive():
+    index = _index(*CORPUS)
+    for query, position in (("What is the rating of the XJ-220?", 0), ("Which bug does v2.1.3 fix?", 2),
+                            ("When did order 4417702 ship?", 4)):
+        hits = index.search(query, 10)
+        assert hits[0][0] == position
+        assert index.is_decisive(query, hits, RATIO, MIN_IDF)
+
+
+@pytest.mark.parametrize("query", ["What was the weather in 1998?", "What year did I turn 2?", "How do I service the pump?"])
+def test_questions_without_identifiers_are_not_decisive(query):
+    index = _index(*CORPUS)
+    assert not index.is_decisive(query, index.search(query, 10), RATIO, MIN_IDF)
+
+
+def test_common_identifiers_are_not_decisive():
+    index = _index("model xj-220 overview", "xj-220 specifications", "xj-220 manual", "unrelated text")
+    query = "xj-220 manual"
+    hits = index.search(query, 10)
+
+    assert hits[0][0] == 2
+    assert not index.is_decisive(query, hits, RATIO, MIN_IDF)
+
+
+def test_close_runner_up_is_not_decisive():
+    index = _index("xj-220 pump", "xj-220 pump", "seals", "sensor", "drift")
+    query = "xj-220"
+    assert not index.is_decisive(query, index.search(query, 10), RATIO, MIN_IDF)
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.cache import SingleFlight
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight("test")
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: flight.run("key", work), range(4)))
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "coalesced": 3}
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        blocked = pool.submit(flight.run, "slow", release.wait)
+        assert flight.run("fast", lambda: "done") == "done"
+        release.set()
+        blocked.result()
+
+
+def test_errors_reach_every_caller_and_free_the_key():
+    flight = SingleFlight("test")
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.run, "key", fail)
+        started.wait()
+        follower = pool.submit(flight.run, "key", lambda: "not called")
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+
+    assert flight.run("key", lambda: "retried") == "retried"
+
+
+def test_async_calls_share_one_coroutine():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def run():
+        return await asyncio.gather(*(flight.arun("key", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == [42] * 5
+    assert len(calls) == 1
+
+
+def test_sync_caller_joins_an_async_call():
+    flight = SingleFlight("test")
+
+    async def run():
+        async def work():
+            await asyncio.sleep(0.1)
+            return "shared"
+
+        leader = asyncio.ensure_future(flight.arun("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.get_running_loop().run_in_executor(None, flight.run, "key", lambda: "own")
+        return await asyncio.gather(leader, follower)
+
+    assert asyncio.run(run()) == ["shared", "shared"]
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "finished"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.arun("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.arun("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "finished"
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from services.sse import COMPACT_FORMAT, coalesce_frames, encode_frame
+
+
+async def _source(*items, closed=None):
+    """Yield payloads; a number sleeps that many seconds first, an exception is raised."""
+    try:
+        for item in items:
+            if isinstance(item, (int, float)):
+                await asyncio.sleep(item)
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+def _text(content):
+    return {"content": content}
+
+
+def _collect(payloads, flush_ms=30, flush_bytes=512, stream_format="json"):
+    """Run coalesce_frames to the end; returns [(seconds since start, frame)]."""
+    async def run():
+        started = time.monotonic()
+        return [
+            (time.monotonic() - started, frame)
+            async for frame in coalesce_frames(payloads, flush_ms, flush_bytes, stream_format)
+        ]
+    return asyncio.run(run())
+
+
+def _frames(timed):
+    return [frame for _, frame in timed]
+
+
+def test_first_chunk_is_sent_immediately():
+    timed = _collect(_source(_text("Hel"), 0.3, _text("lo")), flush_ms=1000)
+    assert _frames(timed) == [encode_frame(_text("Hel")), encode_frame(_text("lo"))]
+    assert timed[0][0] < 0.1
+
+
+def test_chunks_within_the_flush_window_are_merged():
+    timed = _collect(_source(*map(_text, "abcd")), flush_ms=1000)
+    assert _frames(timed) == [encode_frame(_text("a")), encode_frame(_text("bcd"))]
+
+
+def test_buffer_is_flushed_after_flush_ms():
+    timed = _collect(_source(_text("a"), _text("b"), 0.5, _text("c")), flush_ms=50)
+    assert _frames(timed) == [encode_frame(_text(c)) for c in "abc"]
+    # "b" went out on the timeout, well before "c" arrived
+    assert timed[1][0] < 0.3 <= timed[2][0]
+
+
+def test_buffer_is_flushed_at_flush_bytes():
+    timed = _collect(_source(*map(_text, ["a", "bb", "cc", "d"])), flush_ms=10_000, flush_bytes=4)
+    assert _frames(timed) == [encode_frame(_text(c)) for c in ["a", "bbcc", "d"]]
+
+
+def test_zero_flush_ms_sends_every_chunk():
+    timed = _collect(_source(*map(_text, "abc")), flush_ms=0)
+    assert _frames(timed) == [encode_frame(_text(c)) for c in "abc"]
+
+
+def test_other_payloads_flush_the_buffer_and_pass_through():
+    image = {"type": "image", "content": "base64"}
+    timed = _collect(_source(_text("a"), _text("b"), image, _text("c"), {"done": True}), flush_ms=1000)
+    assert _frames(timed) == [
+        encode_frame(_text("a")),
+        encode_frame(_text("b")),
+        encode_frame(image),
+        encode_frame(_text("c")),
+        encode_frame({"done": True}),
+    ]
+
+
+def test_chunks_of_different_shape_are_not_merged():
+    typed = {"content": "b", "type": "text"}
+    timed = _collect(_source(_text("a"), _text("x"), typed), flush_ms=1000)
+    assert _frames(timed) == [encode_frame(_text("a")), encode_frame(_text("x")), encode_frame(typed)]
+
+
+def test_compact_format():
+    timed = _collect(
+        _source(_text("line one\nline two"), {"done": True}), stream_format=COMPACT_FORMAT
+    )
+    assert _frames(timed) == [
+        "data: line one\ndata: line two\n\n",
+        f"event: json\ndata: {json.dumps({'done': True})}\n\n",
+    ]
+
+
+def test_errors_of_the_source_propagate():
+    closed = []
+    frames = []
+
+    async def run():
+        async for frame in coalesce_frames(_source(_text("a"), RuntimeError("model failed"), closed=closed), 30, 512):
+            frames.append(frame)
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        asyncio.run(run())
+    assert frames == [encode_frame(_text("a"))]
+    assert closed
+
+
+def test_closing_the_frames_closes_a_waiting_source():
+    closed = []
+
+    async def run():
+        frames = coalesce_frames(_source(_text("a"), 10, _text("never"), closed=closed), 30, 512)
+        assert await frames.__anext__() == encode_frame(_text("a"))
+        # The source is now sleeping inside its next step
+        pending = asyncio.ensure_future(frames.__anext__())
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        await frames.aclose()
+
+    asyncio.run(asyncio.wait_for(run(), 2))
+    assert closed
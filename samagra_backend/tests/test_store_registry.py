@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+import pytest
+from langchain.schema import Document
+
+from services.rag_service import StoreClosedError, snapshot_executor
+from services.store_registry import StoreRegistry, store_loader_executor
+
+
+def _registry(tmp_path, **overrides):
+    options = dict(
+        data_dir=str(tmp_path),
+        persist=True,
+        max_vectors=1000,
+        max_bytes=1 << 30,
+        idle_seconds=3600,
+        max_total_bytes=0,  # every store that is not in use is over the cap
+    )
+    options.update(overrides)
+    return StoreRegistry(**options)
+
+
+def _add(store, count, filename):
+    docs = [Document(page_content=f"{filename} chunk {i}") for i in range(count)]
+    store.add_documents(docs, {"filename": filename, "content_hash": filename})
+
+
+def _wait_for_snapshots():
+    snapshot_executor.submit(lambda: None).result()
+
+
+def test_leased_store_is_not_evicted(tmp_path):
+    registry = _registry(tmp_path)
+    alice = registry.acquire("alice")
+    _add(alice, 3, "a.pdf")
+
+    bob = registry.acquire("bob")
+    registry.release(bob)
+    _wait_for_snapshots()
+
+    assert registry.acquire("alice") is alice
+    assert not alice.closed and alice.vector_count() == 3
+
+
+def test_released_store_is_evicted_and_restored(tmp_path):
+    registry = _registry(tmp_path)
+    alice = registry.acquire("alice")
+    _add(alice, 3, "a.pdf")
+    registry.release(alice)
+
+    registry.release(registry.acquire("bob"))
+    _wait_for_snapshots()
+    assert "alice" not in registry.stats()["namespaces"]
+    assert alice.closed
+
+    restored = registry.acquire("alice")
+    assert restored is not alice
+    assert restored.vector_count() == 3
+    assert restored.get_file_list() == ["a.pdf"]
+
+
+def test_writes_to_an_unloaded_store_are_rejected(tmp_path):
+    registry = _registry(tmp_path)
+    alice = registry.acquire("alice")
+    _add(alice, 2, "a.pdf")
+    registry.release(alice)
+    registry.release(registry.acquire("bob"))
+    _wait_for_snapshots()
+
+    with pytest.raises(StoreClosedError):
+        _add(alice, 1, "late.pdf")
+    assert registry.acquire("alice").vector_count() == 2
+
+
+def test_idle_store_is_evicted(tmp_path):
+    registry = _registry(tmp_path, idle_seconds=0, max_total_bytes=1 << 30)
+    registry.release(registry.acquire("alice"))
+    registry.release(registry.acquire("bob"))
+    _wait_for_snapshots()
+
+    assert list(registry.stats()["namespaces"]) == ["bob"]
+
+
+def test_without_persistence_evicted_contents_are_discarded(tmp_path):
+    registry = _registry(tmp_path, persist=False)
+    alice = registry.acquire("alice")
+    _add(alice, 2, "a.pdf")
+    registry.release(alice)
+    registry.release(registry.acquire("bob"))
+    _wait_for_snapshots()
+
+    assert registry.acquire("alice").vector_count() == 0
+
+
+def test_lease_context_manager(tmp_path):
+    registry = _registry(tmp_path)
+
+    async def run():
+        async with registry.lease("alice") as alice:
+            assert alice.busy
+            _add(alice, 1, "a.pdf")
+        assert not alice.busy
+        return alice
+
+    alice = asyncio.run(run())
+    registry.release(registry.acquire("bob"))
+    _wait_for_snapshots()
+    assert alice.closed
+
+
+def test_loaded_store_is_leased_without_the_loader_pool(tmp_path):
+    registry = _registry(tmp_path, max_total_bytes=1 << 30)
+    registry.release(registry.acquire("alice"))
+    release = threading.Event()
+    blockers = [store_loader_executor.submit(release.wait) for _ in range(store_loader_executor._max_workers)]
+
+    async def run():
+        return await asyncio.wait_for(registry.aacquire("alice"), 1)
+
+    try:
+        assert asyncio.run(run()).namespace == "alice"
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result()
+
+
+def test_invalid_namespace_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _registry(tmp_path).acquire("../etc")
@@ -0,0 +1,118 @@
+import faiss
+import numpy as np
+import pytest
+
+from services import vector_index
+from services.vector_index import (
+    FLAT,
+    HNSW,
+    IVFPQ,
+    IVFPQ_MIN_TRAINING_VECTORS,
+    build_index,
+    index_type,
+    reconstruct_vectors,
+    target_index_type,
+    without_vectors,
+)
+
+
+def _vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+@pytest.fixture
+def small_ivf(monkeypatch):
+    """Few coarse lists, so IVF-PQ trains quickly."""
+    monkeypatch.setattr(vector_index.settings, "IVF_NLIST", 16)
+
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    monkeypatch.setattr(vector_index.settings, "VECTOR_INDEX_TYPE", "auto")
+    monkeypatch.setattr(vector_index.settings, "VECTOR_INDEX_AUTO_HNSW_MIN_VECTORS", 100)
+
+
+def test_auto_moves_from_flat_to_hnsw_and_never_to_ivfpq(thresholds):
+    assert target_index_type(99) == FLAT
+    assert target_index_type(100) == HNSW
+    assert target_index_type(10_000_000) == HNSW
+
+
+def test_ivfpq_is_used_only_when_configured_and_trainable():
+    assert target_index_type(IVFPQ_MIN_TRAINING_VECTORS - 1, IVFPQ) == FLAT
+    assert target_index_type(IVFPQ_MIN_TRAINING_VECTORS, IVFPQ) == IVFPQ
+    assert target_index_type(10, "bogus") == FLAT
+
+
+@pytest.mark.parametrize("kind", [FLAT, HNSW])
+def test_built_index_finds_exact_neighbours(kind):
+    vectors = _vectors(500)
+    index = build_index(kind, 8)
+    index.add(vectors)
+
+    assert index_type(index) == kind
+    _, found = index.search(vectors[:20], 1)
+    assert found[:, 0].tolist() == list(range(20))
+
+
+def test_ivfpq_needs_training_vectors(small_ivf):
+    with pytest.raises(ValueError):
+        build_index(IVFPQ, 8, _vectors(100))
+
+    vectors = _vectors(IVFPQ_MIN_TRAINING_VECTORS)
+    index = build_index(IVFPQ, 8, vectors)
+    index.add(vectors)
+    assert index_type(index) == IVFPQ and index.ntotal == len(vectors)
+
+
+def test_without_vectors_keeps_the_order_of_the_rest():
+    vectors = _vectors(10)
+    index = build_index(FLAT, 8)
+    index.add(vectors)
+
+    smaller = without_vectors(index, [0, 4])
+
+    assert index.ntotal == 10
+    np.testing.assert_allclose(reconstruct_vectors(smaller), np.delete(vectors, [0, 4], axis=0))
+
+
+def test_without_vectors_on_ivfpq_leaves_the_live_index_untouched(small_ivf):
+    vectors = _vectors(IVFPQ_MIN_TRAINING_VECTORS)
+    index = build_index(IVFPQ, 8, vectors)
+    index.add(vectors)
+
+    smaller = without_vectors(index, range(100))
+
+    assert smaller.ntotal == len(vectors) - 100 and index_type(smaller) == IVFPQ
+    assert index.ntotal == len(vectors)
+    assert faiss.extract_index_ivf(index).direct_map.type == faiss.DirectMap.NoMap
+
+
+def test_recall_queries_are_held_out_of_the_indexed_sample(monkeypatch):
+    added = []
+
+    class RecordingIndex(faiss.IndexFlatL2):
+        def add(self, vectors):
+            added.append(vectors.copy())
+            super().add(vectors)
+
+    monkeypatch.setattr(vector_index, "build_index", lambda kind, dim, *args: RecordingIndex(dim))
+    sample = _vectors(100)
+    like = faiss.IndexFlatL2(8)
+
+    assert vector_index.estimate_recall(sample, like, k=5) == 1.0
+    indexed = {row.tobytes() for row in np.concatenate(added)}
+    assert len(indexed) == 80
+    assert not any(query.tobytes() in indexed for query in sample[:20])
+
+
+def test_recall_of_quantized_storage_is_estimated(monkeypatch):
+    monkeypatch.setattr(vector_index.settings, "VECTOR_QUANTIZATION", "int8")
+    sample = _vectors(500)
+    like = build_index(FLAT, 8, sample, "int8")
+
+    recall = vector_index.estimate_recall(sample, like)
+    assert 0.5 < recall <= 1.0
+    assert vector_index.estimate_recall(sample[:12], like) is None